@@ -1,5 +1,199 @@
+"""Entry point of the project.
+
+Without arguments it runs the interactive searchMethods.trace(), on the default
+8x8 board with pump in (1,8). Otherwise it solves every instance in the given
+JSON/JSONL files (see instances.py; '-' reads JSON lines from stdin) and
+writes one JSON result per instance on stdout, as soon as it is solved:
+
+    python Project.py boards.jsonl --search astar --heuristic WaterPumpAdmissible
+
+With --metrics FILE the progress of every search (expansions, frontier size,
+memory, ...) is appended to FILE as JSON lines, every --interval seconds.
+With --cache FILE solutions are kept in (and, once replayed and checked,
+answered from) a sqlite cache, see solutionCache.py. With --spill N the
+closed set of astar keeps at most N states in memory and the rest on disk;
+with --frontier-budget N so does its frontier, in sorted runs. With
+--checkpoint DIR an astar search is saved in DIR (see checkpoint_path) every
+--checkpoint-interval seconds, and with --resume too the searches continue
+from the checkpoints found there. --time-limit and --memory-limit stop every
+astar search that runs out of them, with the lower bound on the cost and the
+plan of a greedy dive, if it finds one, in the result. --table-size N sets
+the number of states in the transposition table of idastar.
+"""
+from __future__ import print_function
+
+import argparse
+import hashlib
+import json
+import os
+import resource
+import sys
+import time
+from collections import OrderedDict
+
 import searchMethods
-"""The default board is a 8x8 board with pump in (1,8); to change that, manually modify 
-   function trace() in searchMethods.py."""
+from checkpoint import Checkpoint
+from instances import DEFAULT_BOARD, DEFAULT_PUMP, read_instances, make_problem
+from closedSet import SpillingClosedSet
+from metrics import Budget, Metrics, JSONLSink
+from solutionCache import SolutionCache
+from waterPump import HEURISTICS, action_name
+
+
+def checkpoint_path(directory, instance, heuristic):
+    """Checkpoint file in directory of the search of instance with heuristic,
+    named after a hash of the board, the pump and the vases in their order
+    (which the state keys depend on), not after the instance name."""
+    description = json.dumps([instance.get('board', DEFAULT_BOARD), instance.get('pump', DEFAULT_PUMP),
+                              instance['vases']], sort_keys=True)
+    digest = hashlib.sha1(description.encode('utf-8')).hexdigest()
+    return os.path.join(directory, '%s-%s.checkpoint' % (digest, heuristic))
+
+
+def solve(instance, search='astar', heuristic='WaterPump', metrics=None, cache=None,
+          partial_order=False, spill=None, frontier_budget=None, checkpoint=None, resume=None,
+          budget=None, table_size=None):
+    """Solve one instance dict and return the result as a dict. What the
+    problem and the search print is discarded; their progress goes to metrics
+    if given. With a SolutionCache, a cached plan is returned instead of
+    searching (with 'cached': true) and new plans are added to it.
+    peak_rss_mb is the high-water mark of the whole process, so with many
+    instances it only grows. partial_order turns on the partial-order
+    reduction of WaterPump.successor. spill, for astar, is the number of
+    closed states kept in memory before the others go to disk, and
+    frontier_budget the same for the frontier. checkpoint (a
+    checkpoint.Checkpoint) and resume (the path of a checkpoint to continue
+    from) and budget (a metrics.Budget) are passed to astar, table_size (the
+    transposition table of idastar) to idastar."""
+    result = OrderedDict([('name', instance.get('name')), ('search', search), ('heuristic', heuristic)])
+    if cache is not None:
+        start = time.time()
+        cached = cache.get(instance, search, heuristic)
+        if cached is not None:
+            result['time'] = time.time() - start
+            result['status'] = 'solved'
+            result['cached'] = True
+            result.update(cached['stats'])
+            result['actions'] = cached['actions']
+            result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+            return result
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    closed = None
+    try:
+        problem = make_problem(instance, heuristic, partial_order)
+        options = {'metrics': metrics}
+        if spill:
+            closed = options['closed'] = SpillingClosedSet(spill, key_bits=problem.layout.key_bits)
+        if frontier_budget:
+            options['frontier_budget'] = frontier_budget
+        if checkpoint is not None:
+            options['checkpoint'] = checkpoint
+        if resume is not None:
+            options['resume'] = resume
+        if budget is not None:
+            options['budget'] = budget
+        if table_size is not None:
+            options['table_size'] = table_size
+        start = time.time()
+        solution = searchMethods.SEARCHES[search](problem, **options)
+        result['time'] = time.time() - start
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        if closed is not None:
+            closed.close()
+    if isinstance(solution, searchMethods.Node):
+        path = solution.path()
+        path.reverse()
+        result['status'] = 'solved'
+        result.update(problem.stats)
+        result['actions'] = [[action_name(node.action), node.i, node.j] for node in path[1:]]
+        if cache is not None:
+            cache.put(instance, search, heuristic, result['actions'], solution.path_cost, problem.stats)
+    else:
+        result['status'] = solution.status
+        result.update(problem.stats)
+        if solution.lower_bound == searchMethods.infinity:
+            del result['lower_bound']
+        if solution.incumbent is not None:
+            path = solution.incumbent.path()
+            path.reverse()
+            result['actions'] = [[action_name(node.action), node.i, node.j] for node in path[1:]]
+    result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    return result
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        return searchMethods.trace()
+    parser = argparse.ArgumentParser(description='Solve water distribution instances.')
+    parser.add_argument('instances', nargs='+', help='JSON or JSONL instance files')
+    parser.add_argument('--search', default='astar', choices=sorted(searchMethods.SEARCHES))
+    parser.add_argument('--heuristic', default='WaterPump', choices=HEURISTICS)
+    parser.add_argument('--metrics', metavar='FILE', help='append progress samples to FILE (JSON lines)')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between progress samples')
+    parser.add_argument('--cache', metavar='FILE', help='sqlite file of cached solutions')
+    parser.add_argument('--partial-order', action='store_true',
+                        help='skip moves that commute with the previous one')
+    parser.add_argument('--spill', type=int, metavar='N',
+                        help='keep at most N closed states in memory, the rest on disk (astar only)')
+    parser.add_argument('--frontier-budget', type=int, metavar='N',
+                        help='keep at most N frontier nodes in memory, the rest on disk (astar only)')
+    parser.add_argument('--checkpoint', metavar='DIR', help='save the searches to DIR from time to time (astar only)')
+    parser.add_argument('--checkpoint-interval', type=float, default=600.0,
+                        help='seconds between checkpoints')
+    parser.add_argument('--resume', action='store_true', help='continue the searches saved in the --checkpoint DIR')
+    parser.add_argument('--table-size', type=int, metavar='N',
+                        help='states in the transposition table of idastar (default %d, 0 for none)'
+                        % searchMethods.TABLE_SIZE)
+    parser.add_argument('--time-limit', type=float, metavar='SECONDS', help='stop each search after SECONDS (astar only)')
+    parser.add_argument('--memory-limit', type=float, metavar='MB',
+                        help='stop each search when the process uses MB of memory (astar only)')
+    args = parser.parse_args(argv)
+    if args.spill and args.search != 'astar':
+        parser.error('--spill only works with --search astar')
+    if args.frontier_budget and args.search != 'astar':
+        parser.error('--frontier-budget only works with --search astar')
+    if args.checkpoint and (args.search != 'astar' or args.frontier_budget):
+        parser.error('--checkpoint only works with --search astar, without --frontier-budget')
+    if args.resume and not args.checkpoint:
+        parser.error('--resume needs --checkpoint')
+    if args.table_size is not None and args.search != 'idastar':
+        parser.error('--table-size only works with --search idastar')
+    if (args.time_limit or args.memory_limit) and args.search != 'astar':
+        parser.error('--time-limit and --memory-limit only work with --search astar')
+    if args.checkpoint and not os.path.isdir(args.checkpoint):
+        os.makedirs(args.checkpoint)
+    sinks = [JSONLSink(args.metrics)] if args.metrics else []
+    cache = SolutionCache(args.cache) if args.cache else None
+    for path in args.instances:
+        for instance in read_instances(path):
+            metrics = Metrics(sinks, args.interval, {'name': instance.get('name')})
+            checkpoint = resume = None
+            if args.checkpoint:
+                saved = checkpoint_path(args.checkpoint, instance, args.heuristic)
+                checkpoint = Checkpoint(saved, args.checkpoint_interval)
+                if args.resume and os.path.exists(saved):
+                    resume = saved
+            budget = None
+            if args.time_limit or args.memory_limit:
+                budget = Budget(args.time_limit, args.memory_limit)
+            try:
+                result = solve(instance, args.search, args.heuristic, metrics, cache,
+                               args.partial_order, args.spill, args.frontier_budget,
+                               checkpoint, resume, budget, args.table_size)
+            except (KeyError, TypeError, ValueError) as e:
+                result = OrderedDict([('name', instance.get('name')), ('status', 'error'),
+                                      ('error', str(e))])
+            print(json.dumps(result))
+            sys.stdout.flush()
+    for sink in sinks:
+        sink.close()
+    if cache is not None:
+        cache.close()
+
 
-searchMethods.trace()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
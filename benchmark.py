@@ -0,0 +1,134 @@
+"""Benchmark suite for the search engine. Every (instance, heuristic) run is
+repeated, one at a time and each in a fresh process, and summarized as wall
+time (median over the repetitions), expansions per second, peak RSS and peak
+frontier size. The summary can be saved as a baseline and later runs are
+compared to it: a metric that got worse by more than the threshold is a
+regression, and the exit status is 1.
+
+    python benchmark.py --save                 # record benchmark_baseline.json
+    python benchmark.py --threshold 0.2        # compare against it
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+
+from experiments import run_experiments
+from generator import TIERS, generate_tier
+from instances import builtin_instances, read_instances
+from searchMethods import SEARCHES
+from utils import median, print_table
+from waterPump import PROBLEMS, HEURISTICS
+
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+
+# Metric name and whether a larger value is worse (+1) or better (-1)
+METRICS = [('time', 1), ('expansions_per_sec', -1), ('peak_rss_mb', 1),
+           ('frontier_peak', 1), ('nodes_expanded', 1)]
+
+
+def run_benchmark(boards, heuristics=HEURISTICS, search='astar', repeat=3, timeout=None):
+    """Run every board with every heuristic repeat times and return a dict
+    mapping 'board/heuristic/search' to the summary of the runs. A key whose
+    runs did not all solve the instance maps to {'status': ...} only."""
+    jobs = [(b, h, search) for b in boards for h in heuristics for r in xrange(repeat)]
+    results = run_experiments(jobs, processes=1, timeout=timeout)
+    summary = {}
+    for start in xrange(0, len(results), repeat):
+        runs = results[start:start + repeat]
+        key = '%s/%s/%s' % (runs[0]['problem'], runs[0]['heuristic'], runs[0]['search'])
+        failed = [r['status'] for r in runs if r['status'] != 'solved']
+        if failed:
+            summary[key] = {'status': failed[0]}
+            continue
+        elapsed = median([r['time'] for r in runs])
+        summary[key] = {'status': 'solved',
+                        'time': elapsed,
+                        'nodes_expanded': runs[0]['nodes_expanded'],
+                        'expansions_per_sec': runs[0]['nodes_expanded'] / max(elapsed, 1e-9),
+                        'peak_rss_mb': max(r['peak_rss_mb'] for r in runs),
+                        'frontier_peak': runs[0].get('frontier_peak', 0),
+                        'path_cost': runs[0]['path_cost']}
+    return summary
+
+
+def compare(summary, baseline, threshold=0.1):
+    """Return the regressions of summary against baseline as a list of
+    (key, metric, baseline value, new value). A run that used to solve its
+    instance and no longer does counts as a regression on 'status'."""
+    regressions = []
+    for key in sorted(summary):
+        new, old = summary[key], baseline.get(key)
+        if old is None or old['status'] != 'solved':
+            continue
+        if new['status'] != 'solved':
+            regressions.append((key, 'status', old['status'], new['status']))
+            continue
+        for metric, direction in METRICS:
+            if metric in old and direction * (new[metric] - old[metric]) > threshold * abs(old[metric]):
+                regressions.append((key, metric, old[metric], new[metric]))
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as stream:
+        return json.load(stream)
+
+
+def save_baseline(summary, path):
+    with open(path, 'w') as stream:
+        json.dump(summary, stream, indent=1, sort_keys=True)
+
+
+def print_summary(summary, baseline={}):
+    header = ['run', 'status'] + [m for m, d in METRICS] + ['time vs baseline']
+    rows = []
+    for key in sorted(summary):
+        s = summary[key]
+        old = baseline.get(key, {})
+        ratio = s['time'] / old['time'] if 'time' in s and old.get('time') else '-'
+        rows.append([key, s['status']] + [s.get(m, '-') for m, d in METRICS] + [ratio])
+    print_table(rows, header=header, numfmt='%.4g')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--problems', nargs='*', default=PROBLEMS, choices=PROBLEMS)
+    parser.add_argument('--instances', nargs='+', default=[], help='JSON or JSONL instance files')
+    parser.add_argument('--tiers', nargs='+', default=[], choices=sorted(TIERS),
+                        help='also run generated instances of these difficulty tiers')
+    parser.add_argument('--per-tier', type=int, default=3)
+    parser.add_argument('--heuristics', nargs='+', default=HEURISTICS, choices=HEURISTICS)
+    parser.add_argument('--search', default='astar', choices=sorted(SEARCHES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=None, help='seconds per run')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative change counted as a regression')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    args = parser.parse_args(argv)
+    if not args.save and not os.path.exists(args.baseline):
+        parser.error('no baseline %s to compare with (record one with --save)' % args.baseline)
+
+    boards = builtin_instances(args.problems)
+    for path in args.instances:
+        boards.extend(read_instances(path))
+    for tier in args.tiers:
+        boards.extend(generate_tier(tier, args.per_tier))
+    summary = run_benchmark(boards, args.heuristics, args.search, args.repeat, args.timeout)
+    if args.save:
+        save_baseline(summary, args.baseline)
+        print_summary(summary)
+        return 0
+    baseline = load_baseline(args.baseline)
+    print_summary(summary, baseline)
+    regressions = compare(summary, baseline, args.threshold)
+    for key, metric, old, new in regressions:
+        print('REGRESSION', key, metric, old, '->', new)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
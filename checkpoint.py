@@ -0,0 +1,196 @@
+"""Checkpoints of graph_search, to resume long searches after an interruption.
+
+A snapshot holds what graph_search has accumulated: the counters, the closed
+set (the best g of every generated state and whether it was expanded) and the
+nodes of the frontier together with their ancestors, so that the path of a
+solution found after resuming is complete. It is a gzip file:
+
+    a JSON header line (format, problem class, Problem.instance_key,
+    counters, number of nodes)
+    the nodes, parents first: NODE record + hex key of the state
+    the closed entries up to the end: ENTRY record + hex key
+
+Saving is done by a forked copy of the process (where os.fork exists), which
+sees the search as it was at the fork, writes the snapshot next to path and
+renames it over path; the search goes on meanwhile. A snapshot is only
+started once the previous writer has finished, and until then the closed set
+is frozen (see ClosedSet.freeze) so that the part of it on disk stays as it
+was at the fork. A writer that fails prints its traceback, and the search
+raises IOError when it finds out.
+"""
+import gzip
+import json
+import os
+import struct
+import time
+import traceback
+
+FORMAT = 2
+
+# g, h (nan if not evaluated), f, action (-1 for the root), i, j, index of
+# the parent (-1 for the root), queued (in the frontier), length of the key
+NODE = struct.Struct('<dddbhhi?H')
+
+# g, expanded, length of the key
+ENTRY = struct.Struct('<d?H')
+
+NAN = float('nan')
+
+
+def write(path, problem, frontier, closed, counters):
+    """Write the snapshot of a search to path (through a temporary file, so
+    that path always holds a complete snapshot)."""
+    key = problem.state_key
+    index = {}
+    nodes = []
+    for node in frontier:
+        chain = []
+        ancestor = node
+        while ancestor is not None and id(ancestor) not in index:
+            chain.append(ancestor)
+            ancestor = ancestor.parent
+        for ancestor in reversed(chain):
+            index[id(ancestor)] = len(nodes)
+            nodes.append(ancestor)
+    queued = set(id(node) for node in frontier)
+    header = {'format': FORMAT,
+              'problem': type(problem).__name__,
+              'instance': problem.instance_key(),
+              'counters': counters,
+              'nodes': len(nodes)}
+    temporary = path + '.tmp'
+    stream = gzip.open(temporary, 'wb', 1)
+    done = False
+    try:
+        stream.write(json.dumps(header) + '\n')
+        for node in nodes:
+            state_key = '%x' % key(node.state)
+            parent = -1 if node.parent is None else index[id(node.parent)]
+            action = -1 if node.action is None else node.action
+            stream.write(NODE.pack(node.path_cost, getattr(node, 'h', NAN), getattr(node, 'f', NAN),
+                                   action, node.i, node.j, parent, id(node) in queued,
+                                   len(state_key)))
+            stream.write(state_key)
+        for state_key, (g, expanded) in closed.items():
+            state_key = '%x' % state_key
+            stream.write(ENTRY.pack(g, expanded, len(state_key)))
+            stream.write(state_key)
+        done = True
+    finally:
+        stream.close()
+        if not done:
+            os.remove(temporary)
+    os.rename(temporary, path)
+
+
+class Snapshot:
+    """A snapshot read back by load: header (a dict with the counters), the
+    queued nodes and the closed entries, as a list of (key, g, expanded)."""
+
+    def __init__(self, header, frontier, closed):
+        self.header = header
+        self.counters = header['counters']
+        self.frontier = frontier
+        self.closed = closed
+
+
+def load(path, problem):
+    """Read the snapshot at path, rebuilding its nodes for problem (of the
+    same class and with the same instance_key as the one that wrote it,
+    ValueError otherwise)."""
+    from searchMethods import Node
+    stream = gzip.open(path, 'rb')
+    try:
+        header = json.loads(stream.readline())
+        if header.get('format') != FORMAT:
+            raise ValueError('%s: unknown checkpoint format %r' % (path, header.get('format')))
+        if header['problem'] != type(problem).__name__ or \
+                header['instance'] != problem.instance_key():
+            raise ValueError('%s is a checkpoint of another problem' % path)
+        nodes = []
+        frontier = []
+        for k in xrange(header['nodes']):
+            g, h, f, action, i, j, parent, queued, size = NODE.unpack(stream.read(NODE.size))
+            state = problem.state_from_key(int(stream.read(size), 16))
+            node = Node(state, i, j, None if parent < 0 else nodes[parent],
+                        None if action < 0 else action, g)
+            if h == h:
+                node.h = h
+            if f == f:
+                node.f = f
+            nodes.append(node)
+            if queued:
+                frontier.append(node)
+        closed = []
+        while True:
+            data = stream.read(ENTRY.size)
+            if not data:
+                break
+            g, expanded, size = ENTRY.unpack(data)
+            closed.append((int(stream.read(size), 16), g, expanded))
+    finally:
+        stream.close()
+    return Snapshot(header, frontier, closed)
+
+
+class Checkpoint:
+    """Periodic snapshots of a graph_search to path, every interval seconds.
+    With fork=False (or without os.fork) they are written by the search
+    itself, which stops while they are."""
+
+    def __init__(self, path, interval=600.0, fork=True):
+        self.path = path
+        self.interval = interval
+        self.fork = fork and hasattr(os, 'fork')
+        self.writer = None
+        self.closed = None
+        self.saved = 0
+        self.next_save = time.time() + interval
+
+    def due(self):
+        """True if a snapshot should be taken now: interval seconds passed and
+        the previous writer is done."""
+        if time.time() < self.next_save:
+            return False
+        return not self.busy()
+
+    def busy(self):
+        if self.writer is None:
+            return False
+        pid, status = os.waitpid(self.writer, os.WNOHANG)
+        if pid == 0:
+            return True
+        self.finish(status)
+        return False
+
+    def finish(self, status):
+        """Forget the writer, which exited with status, and thaw the closed
+        set; IOError if the writer failed."""
+        self.writer = None
+        self.closed.thaw()
+        if not os.WIFEXITED(status) or os.WEXITSTATUS(status):
+            raise IOError('the checkpoint writer of %s failed (wait status %d)' % (self.path, status))
+
+    def save(self, problem, frontier, closed, counters):
+        self.saved += 1
+        if not self.fork:
+            write(self.path, problem, frontier, closed, counters)
+        else:
+            self.closed = closed
+            closed.freeze()
+            self.writer = os.fork()
+            if not self.writer:
+                code = 1
+                try:
+                    write(self.path, problem, frontier, closed, counters)
+                    code = 0
+                except Exception:
+                    traceback.print_exc()
+                finally:
+                    os._exit(code)
+        self.next_save = time.time() + self.interval
+
+    def wait(self):
+        """Wait for the snapshot being written, if any."""
+        if self.writer is not None:
+            self.finish(os.waitpid(self.writer, 0)[1])
@@ -0,0 +1,155 @@
+"""Closed-set backends for graph_search.
+
+A backend maps the compact key of a state (see WaterPump.state_key) to the
+pair (g, expanded): the cheapest path cost the state was generated with and
+whether it has been expanded. graph_search asks for the entries of all the
+children of an expansion in one get_many call.
+
+ClosedSet keeps everything in a dict. SpillingClosedSet keeps at most
+max_entries entries in memory and, when there are more, moves them all to a
+sqlite table in one batch; lookups that miss in memory go to the table, one
+query per batch of keys.
+"""
+import os
+import sqlite3
+import tempfile
+
+# Largest number of keys in one sqlite query (its limit on variables is 999)
+QUERY_KEYS = 900
+
+
+class ClosedSet:
+    """In-memory backend."""
+
+    def __init__(self):
+        self.table = {}
+
+    def get_many(self, keys):
+        """The (g, expanded) entry of every key, None for unknown keys."""
+        get = self.table.get
+        return [get(key) for key in keys]
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def put(self, key, g, expanded=False):
+        self.table[key] = (g, expanded)
+
+    def __len__(self):
+        return len(self.table)
+
+    def items(self):
+        """Iterate over the (key, (g, expanded)) pairs, in no particular order."""
+        return self.table.iteritems()
+
+    def freeze(self):
+        """Leave the stored entries where they are until thaw, e.g. while a
+        forked checkpoint writer reads them; new entries stay in memory."""
+
+    def thaw(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SpillingClosedSet(ClosedSet):
+    """Backend that spills to a sqlite file (a temporary one unless path is
+    given) once more than max_entries entries are in memory. Keys wider than
+    63 bits are stored as fixed-width blobs."""
+
+    def __init__(self, max_entries=1000000, path=None, key_bits=63):
+        ClosedSet.__init__(self)
+        self.max_entries = max_entries
+        self.temporary = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(suffix='.sqlite')
+            os.close(fd)
+        self.path = path
+        self.on_disk = 0
+        self.frozen = False
+        if key_bits <= 63:
+            self.encode = int
+            self.decode = int
+        else:
+            width = (key_bits + 7) // 8
+            self.encode = lambda key: sqlite3.Binary(('%0*x' % (2 * width, key)).decode('hex'))
+            self.decode = lambda blob: int(str(blob).encode('hex'), 16)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode = OFF')
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute('DROP TABLE IF EXISTS closed')
+        self.connection.execute('CREATE TABLE closed (key PRIMARY KEY, g REAL, expanded INTEGER)')
+
+    def get_many(self, keys):
+        entries = ClosedSet.get_many(self, keys)
+        if self.on_disk:
+            missing = [key for key, entry in zip(keys, entries) if entry is None]
+            if missing:
+                found = self.lookup(missing)
+                entries = [found.get(key) if entry is None else entry
+                           for key, entry in zip(keys, entries)]
+        return entries
+
+    def lookup(self, keys):
+        """Entries of keys stored on disk, as a dict."""
+        found = {}
+        encode, decode = self.encode, self.decode
+        for start in xrange(0, len(keys), QUERY_KEYS):
+            chunk = [encode(key) for key in keys[start:start + QUERY_KEYS]]
+            query = 'SELECT key, g, expanded FROM closed WHERE key IN (%s)' % ','.join('?' * len(chunk))
+            for key, g, expanded in self.connection.execute(query, chunk):
+                found[decode(key)] = (g, bool(expanded))
+        return found
+
+    def put(self, key, g, expanded=False):
+        self.table[key] = (g, expanded)
+        if len(self.table) > self.max_entries and not self.frozen:
+            self.spill()
+
+    def spill(self):
+        """Move the entries in memory to disk, in one transaction. on_disk
+        grows by the number of rows the INSERT adds, the keys that were not
+        on disk yet."""
+        encode = self.encode
+        rows = [(g, int(expanded), encode(key)) for key, (g, expanded) in self.table.iteritems()]
+        self.connection.executemany('UPDATE closed SET g = ?, expanded = ? WHERE key = ?', rows)
+        added = self.connection.executemany('INSERT OR IGNORE INTO closed (g, expanded, key) VALUES (?, ?, ?)',
+                                            rows).rowcount
+        self.connection.commit()
+        self.on_disk += added
+        self.table = {}
+
+    def __len__(self):
+        if not self.on_disk:
+            return len(self.table)
+        return self.on_disk + len(self.table) - len(self.lookup(list(self.table)))
+
+    def freeze(self):
+        # Spilling would write to the file while the writer reads it
+        self.frozen = True
+
+    def thaw(self):
+        self.frozen = False
+        if len(self.table) > self.max_entries:
+            self.spill()
+
+    def items(self):
+        # A connection of its own, so that it can run in a forked process
+        # (a checkpoint writer, see freeze) as well as in the search
+        for item in self.table.iteritems():
+            yield item
+        if self.on_disk:
+            connection = sqlite3.connect(self.path)
+            try:
+                for key, g, expanded in connection.execute('SELECT key, g, expanded FROM closed'):
+                    key = self.decode(key)
+                    if key not in self.table:
+                        yield key, (g, bool(expanded))
+            finally:
+                connection.close()
+
+    def close(self):
+        self.connection.close()
+        if self.temporary:
+            os.remove(self.path)
@@ -0,0 +1,131 @@
+"""Batch runner for the comparison between uninformed and informed search:
+every problem instance is solved with every heuristic, each job in its own
+process (up to one per core), and the Stats of all the runs are collected in
+a single table. The instances are the built-in boards and, optionally, those
+in JSON/JSONL files (see instances.py).
+
+    python experiments.py --timeout 600 --memory 4096
+"""
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+import searchMethods
+from instances import builtin_instances, make_problem, read_instances
+from searchMethods import SEARCHES
+from searchStats import summarize
+from utils import print_table
+from waterPump import PROBLEMS, HEURISTICS
+
+
+def run_job(instance, heuristic_name, search_name, memory_mb, conn):
+    """Solve one instance with one heuristic and send a result dict through
+    conn. Runs in a child process: its output is discarded and, if memory_mb
+    is given, its address space is limited so a runaway search fails with
+    MemoryError instead of taking the machine down."""
+    sys.stdout = open(os.devnull, 'w')
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    result = {'problem': instance.get('name'), 'heuristic': heuristic_name, 'search': search_name}
+    try:
+        problem = make_problem(instance, heuristic_name)
+        start = time.time()
+        solution = SEARCHES[search_name](problem)
+        result['time'] = time.time() - start
+        if isinstance(solution, searchMethods.Node):
+            result['status'] = 'solved'
+            result.update(problem.stats)
+        else:
+            result['status'] = solution.status
+            result.update(solution.stats)
+    except MemoryError:
+        result['status'] = 'memory'
+    result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    conn.send(result)
+    conn.close()
+
+
+def run_experiments(jobs, processes=None, timeout=None, memory_mb=None):
+    """Run the (instance, heuristic, search) jobs, at most processes at a time
+    (default: one per core), and return their results in job order. A job
+    that runs longer than timeout seconds is killed and reported as
+    'timeout'; one that dies without reporting is reported as 'crashed'."""
+    processes = processes or multiprocessing.cpu_count()
+    pending = list(enumerate(jobs))
+    running = []
+    results = [None] * len(pending)
+    while pending or running:
+        while pending and len(running) < processes:
+            index, job = pending.pop(0)
+            receiver, sender = multiprocessing.Pipe(False)
+            process = multiprocessing.Process(target=run_job, args=tuple(job) + (memory_mb, sender))
+            process.start()
+            sender.close()
+            running.append((index, job, process, receiver, time.time()))
+        for entry in list(running):
+            index, job, process, receiver, started = entry
+            # Liveness first: a job that sends its result and exits between
+            # the two checks is then still found with its result in the pipe
+            alive = process.is_alive()
+            if receiver.poll():
+                try:
+                    results[index] = receiver.recv()
+                except EOFError:
+                    results[index] = job_result(job, status='crashed')
+            elif not alive:
+                results[index] = job_result(job, status='crashed')
+            elif timeout and time.time() - started > timeout:
+                process.terminate()
+                results[index] = job_result(job, status='timeout', time=time.time() - started)
+            else:
+                continue
+            process.join()
+            receiver.close()
+            running.remove(entry)
+        time.sleep(0.05)
+    return results
+
+
+def job_result(job, **entries):
+    """Result dict for a job that did not report one itself."""
+    instance, heuristic_name, search_name = job
+    return dict(problem=instance.get('name'), heuristic=heuristic_name, search=search_name, **entries)
+
+
+COLUMNS = ['problem', 'heuristic', 'search', 'status', 'path_cost', 'depth', 'nodes_expanded',
+           'penetrance', 'ebf', 'time', 'expansions_per_sec', 'cost_ratio', 'expanded_ratio']
+
+
+def print_results(results, columns=COLUMNS):
+    """Print the results as one table, with '-' for missing figures."""
+    rows = [[r.get(c, '-') for c in columns] for r in results]
+    print_table(rows, header=columns, numfmt='%.4g')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--problems', nargs='*', default=PROBLEMS, choices=PROBLEMS)
+    parser.add_argument('--instances', nargs='+', default=[], help='JSON or JSONL instance files')
+    parser.add_argument('--heuristics', nargs='+', default=HEURISTICS, choices=HEURISTICS)
+    parser.add_argument('--search', default='astar', choices=sorted(SEARCHES))
+    parser.add_argument('--processes', type=int, default=None,
+                        help='parallel jobs (default: number of cores)')
+    parser.add_argument('--timeout', type=float, default=None, help='seconds per job')
+    parser.add_argument('--memory', type=int, default=None, help='MBytes per job')
+    args = parser.parse_args(argv)
+    boards = builtin_instances(args.problems)
+    for path in args.instances:
+        boards.extend(read_instances(path))
+    jobs = [(b, h, args.search) for b in boards for h in args.heuristics]
+    results = run_experiments(jobs, args.processes, args.timeout, args.memory)
+    print_results(summarize(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Seeded generator of random, solvable instances (in the format of
+instances.py), to study how the search scales with the number of vases,
+their capacities and the board.
+
+    python generator.py --tier hard --count 20 --seed 1 --out hard.jsonl
+"""
+from __future__ import print_function
+
+import argparse
+import random
+from collections import deque
+
+from instances import DEFAULT_BOARD, DEFAULT_PUMP, instance_from_vases, write_instances
+from solvability import reachable_levels
+from waterPump import ACTION_NAMES, Vase, VaseLayout, WaterDistributionState
+
+ACTIONS = ACTION_NAMES
+
+# Difficulty tiers: number of vases and capacity range; goals are uniform
+TIERS = {'easy': dict(n=3, capacity=(1, 5)),
+         'medium': dict(n=4, capacity=(1, 6)),
+         'hard': dict(n=5, capacity=(1, 7)),
+         'extreme': dict(n=6, capacity=(1, 7))}
+
+
+def successors(state, actions=ACTIONS):
+    """All the states reachable from state with one of actions."""
+    for action, child, i, y in state.successors():
+        if ACTION_NAMES[action] in actions:
+            yield child
+
+
+def reachable(vases, goals, limit=1000000):
+    """Whether the levels goals can be reached from the initial levels of
+    vases, by breadth-first search over the levels (positions do not matter).
+    Returns None if more than limit states were visited without an answer."""
+    layout = VaseLayout(vases, 1, 0, 0)
+    start = WaterDistributionState(layout, [v.value for v in vases])
+    goals = tuple(goals)
+    sets = reachable_levels(layout, start.levels)
+    if any(g not in s for g, s in zip(goals, sets)):
+        return False
+    seen = set([start])
+    queue = deque([start])
+    while queue:
+        state = queue.popleft()
+        if state.levels == goals:
+            return True
+        for child in successors(state):
+            if child not in seen:
+                if len(seen) >= limit:
+                    return None
+                seen.add(child)
+                queue.append(child)
+    return False
+
+
+def random_walk_goals(vases, rng, length):
+    """Goals obtained by applying length random legal actions to the initial
+    levels, so they are reachable by construction. The walk does not empty
+    vases, which would make most goals zero, so it stops early when no other
+    action is legal (every vase full)."""
+    layout = VaseLayout(vases, 1, 0, 0)
+    state = WaterDistributionState(layout, [v.value for v in vases])
+    for step in xrange(length):
+        children = list(successors(state, ACTIONS[1:]))
+        if not children:
+            break
+        state = rng.choice(children)
+    return state.levels
+
+
+def sample(distribution, rng, *args):
+    """Draw from distribution: a (lo, hi) range of integers or a callable
+    taking the random generator (and args)."""
+    if callable(distribution):
+        return distribution(rng, *args)
+    return rng.randint(distribution[0], distribution[1])
+
+
+def random_instance(n, seed=None, capacity=(1, 7), goals='walk', walk=None,
+                    board=DEFAULT_BOARD, pump=DEFAULT_PUMP, name=None, limit=1000000):
+    """A random solvable instance with n vases, as an instance dict.
+    capacity is a (lo, hi) range or a callable rng -> capacity. goals is
+    'walk' (the levels after a random walk of walk legal actions from the
+    empty vases, 2 * n by default), 'uniform' (each goal uniform in
+    [0, capacity], redrawn until reachable) or a callable (rng, capacity) ->
+    goal, also redrawn until reachable. Vases get distinct cells of the
+    board, other than the pump's."""
+    rng = random.Random(seed)
+    cells = [(x, y) for x in xrange(board[0]) for y in xrange(board[1]) if (x, y) != tuple(pump)]
+    if n > len(cells):
+        raise ValueError('%d vases do not fit on a %dx%d board' % (n, board[0], board[1]))
+    while True:
+        positions = rng.sample(cells, n)
+        vases = [Vase(x, y, 0, sample(capacity, rng)) for (x, y) in positions]
+        if goals == 'walk':
+            levels = random_walk_goals(vases, rng, walk or 2 * n)
+        else:
+            distribution = (lambda r, cap: r.randint(0, cap)) if goals == 'uniform' else goals
+            levels = [sample(distribution, rng, v.cap) for v in vases]
+            if not reachable(vases, levels, limit):
+                continue
+        if any(levels):
+            break
+    for vase, level in zip(vases, levels):
+        vase.goal = level
+    return instance_from_vases(name or 'random-%d-%s' % (n, seed), vases, board, pump)
+
+
+def generate_tier(tier, count, seed=0, board=DEFAULT_BOARD, pump=DEFAULT_PUMP):
+    """count instances of a difficulty tier (see TIERS), with seeds seed,
+    seed + 1, ..., named '<tier>-<seed>'."""
+    params = TIERS[tier]
+    return [random_instance(params['n'], seed + k, params['capacity'], 'uniform', None,
+                            board, pump, '%s-%d' % (tier, seed + k))
+            for k in xrange(count)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tier', choices=sorted(TIERS))
+    parser.add_argument('--n', type=int, help='number of vases (instead of a tier)')
+    parser.add_argument('--capacity', type=int, nargs=2, default=(1, 7), metavar=('LO', 'HI'))
+    parser.add_argument('--goals', choices=['walk', 'uniform'], default='walk')
+    parser.add_argument('--walk', type=int, default=None, help='random walk length')
+    parser.add_argument('--board', type=int, nargs=2, default=DEFAULT_BOARD, metavar=('ROWS', 'COLS'))
+    parser.add_argument('--pump', type=int, nargs=2, default=DEFAULT_PUMP, metavar=('X', 'Y'))
+    parser.add_argument('--count', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', required=True, help='.json or .jsonl file')
+    args = parser.parse_args(argv)
+    if args.tier:
+        boards = generate_tier(args.tier, args.count, args.seed, args.board, args.pump)
+    elif args.n:
+        boards = [random_instance(args.n, args.seed + k, tuple(args.capacity), args.goals, args.walk,
+                                  args.board, args.pump)
+                  for k in xrange(args.count)]
+    else:
+        parser.error('give either --tier or --n')
+    write_instances(boards, args.out)
+    print('Wrote', len(boards), 'instances to', args.out)
+
+
+if __name__ == '__main__':
+    main()
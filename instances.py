@@ -0,0 +1,78 @@
+"""Problem instances as plain data, so that they can be stored in JSON files.
+An instance is a dict such as
+
+    {"name": "basicProblem", "board": [8, 8], "pump": [0, 7],
+     "vases": [{"posX": 1, "posY": 3, "goal": 2, "cap": 5}, ...]}
+
+where each vase may also give its initial "value" (default 0). A .json file
+holds one instance or a list of them, a .jsonl file one instance per line.
+"""
+import json
+import sys
+
+import waterPump
+from waterPump import Vase
+
+# Board size and pump position used by trace()
+DEFAULT_BOARD = (8, 8)
+DEFAULT_PUMP = (0, 7)
+
+
+def instance_from_vases(name, vases, board=DEFAULT_BOARD, pump=DEFAULT_PUMP):
+    """Describe a list of Vase objects as an instance dict."""
+    return {'name': name, 'board': list(board), 'pump': list(pump),
+            'vases': [{'posX': v.posX, 'posY': v.posY, 'goal': v.goal, 'cap': v.cap, 'value': v.value}
+                      for v in vases]}
+
+
+def builtin_instances(names=waterPump.PROBLEMS):
+    """The boards defined in waterPump.py, as instance dicts."""
+    return [instance_from_vases(name, getattr(waterPump, name)()) for name in names]
+
+
+def make_vases(instance):
+    return [Vase(v['posX'], v['posY'], v.get('goal', 0), v.get('cap', 0), v.get('value', 0))
+            for v in instance['vases']]
+
+
+def make_problem(instance, heuristic='WaterPump', partial_order=False):
+    """Build the WaterPump subclass named heuristic for an instance dict."""
+    board = instance.get('board', DEFAULT_BOARD)
+    pump = instance.get('pump', DEFAULT_PUMP)
+    problem_class = getattr(waterPump, heuristic)
+    return problem_class(board[0], board[1], pump[0], pump[1], make_vases(instance),
+                         partial_order=partial_order)
+
+
+def read_instances(path):
+    """Yield the instances stored at path ('-' reads JSON lines from stdin).
+    JSON lines are parsed one at a time, so long files are streamed."""
+    if path == '-':
+        stream = sys.stdin
+    else:
+        stream = open(path)
+    try:
+        if path == '-' or path.endswith('.jsonl'):
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            data = json.load(stream)
+            if isinstance(data, dict):
+                data = [data]
+            for instance in data:
+                yield instance
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def write_instances(instances, path):
+    """Store instances at path, as JSON lines if path ends in .jsonl and as a
+    JSON list otherwise."""
+    with open(path, 'w') as stream:
+        if path.endswith('.jsonl'):
+            for instance in instances:
+                stream.write(json.dumps(instance, sort_keys=True) + '\n')
+        else:
+            json.dump(list(instances), stream, indent=1, sort_keys=True)
@@ -0,0 +1,158 @@
+"""Counters and gauges of a search run, published to pluggable sinks.
+
+The searches keep their counters in local variables and hand them to
+Metrics.poll every POLL_EVERY expansions; poll only does something (read the
+RSS, build a sample and pass it to the sinks) once every interval seconds, so
+the hot loop pays for a comparison and nothing else. A sink is any callable
+taking the sample, a dict such as
+
+    {"elapsed": 2.0, "expansions": 5120, "generations": 81230, ...}
+
+MemorySink and JSONLSink keep the samples in a list or append them to a JSON
+lines file; print_sample prints them as progress lines. A Budget holds the
+wall-clock and memory limits of a search, checked at the same polls.
+"""
+from __future__ import print_function
+
+import json
+import os
+import resource
+import time
+from collections import OrderedDict
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Totals that only grow during a search
+COUNTERS = ['expansions', 'generations', 'duplicates', 'reopened', 'heuristic_calls']
+
+# Searches call poll once every POLL_EVERY expansions (a power of two)
+POLL_EVERY = 64
+
+
+def rss_mb():
+    """Resident set size of this process in MBytes, None without psutil."""
+    if psutil is None:
+        return None
+    return psutil.Process(os.getpid()).memory_info()[0] / 1024.0 / 1024.0
+
+
+class Metrics(object):
+    """Registry of the counters (see COUNTERS) and gauges (current values such
+    as frontier, frontier_peak, depth and rss_mb) of a search. labels are
+    added to every sample, e.g. to tell apart the instances of a batch."""
+
+    def __init__(self, sinks=(), interval=1.0, labels=None):
+        self.sinks = list(sinks)
+        self.interval = interval
+        self.labels = labels or {}
+        self.counters = OrderedDict((name, 0) for name in COUNTERS)
+        self.gauges = OrderedDict()
+        self.start = time.time()
+        self.next_sample = self.start + interval
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def update(self, **values):
+        """Set counters and gauges by name (a name that is not a counter is a
+        gauge)."""
+        for name, value in values.items():
+            if name in self.counters:
+                self.counters[name] = value
+            else:
+                self.gauges[name] = value
+
+    def poll(self, **values):
+        """update and sample, if interval seconds passed since the last sample."""
+        if time.time() >= self.next_sample:
+            self.update(**values)
+            self.sample()
+
+    def snapshot(self):
+        record = OrderedDict(self.labels)
+        record['elapsed'] = time.time() - self.start
+        record.update(self.counters)
+        record.update(self.gauges)
+        return record
+
+    def sample(self):
+        """Read the RSS and send a snapshot to every sink."""
+        self.gauges['rss_mb'] = rss_mb()
+        record = self.snapshot()
+        for sink in self.sinks:
+            sink(record)
+        self.next_sample = time.time() + self.interval
+        return record
+
+    def counting(self, name, fn):
+        """fn, counting its calls in the counter name."""
+        counters = self.counters
+
+        def counted(*args):
+            counters[name] += 1
+            return fn(*args)
+        return counted
+
+    def close(self):
+        for sink in self.sinks:
+            if hasattr(sink, 'close'):
+                sink.close()
+
+
+class Budget(object):
+    """Limits of a search: seconds of wall-clock time from start() and
+    memory_mb of resident memory (the peak RSS of the process without
+    psutil). Searches call exceeded every POLL_EVERY expansions and stop when
+    it returns the name of the limit that ran out, 'timeout' or 'memory'."""
+
+    def __init__(self, seconds=None, memory_mb=None):
+        self.seconds = seconds
+        self.memory_mb = memory_mb
+        self.start()
+
+    def start(self):
+        self.deadline = None if self.seconds is None else time.time() + self.seconds
+
+    def exceeded(self):
+        if self.deadline is not None and time.time() >= self.deadline:
+            return 'timeout'
+        if self.memory_mb is not None:
+            rss = rss_mb()
+            if rss is None:
+                rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+            if rss >= self.memory_mb:
+                return 'memory'
+        return None
+
+
+class MemorySink(list):
+    """Keeps the samples in a list."""
+
+    def __call__(self, record):
+        self.append(record)
+
+
+class JSONLSink:
+    """Appends the samples to a JSON lines file, flushed after each one so a
+    long run can be followed with tail -f."""
+
+    def __init__(self, path):
+        self.stream = open(path, 'a')
+
+    def __call__(self, record):
+        self.stream.write(json.dumps(record) + '\n')
+        self.stream.flush()
+
+    def close(self):
+        self.stream.close()
+
+
+def print_sample(record):
+    print('Elapsed', round(record['elapsed'], 1),
+          'Reached depth', record.get('depth'),
+          'Expanded', record['expansions'],
+          'Open len', record.get('frontier'),
+          'Memory used (MBytes)', record.get('rss_mb'))
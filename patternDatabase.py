@@ -0,0 +1,199 @@
+"""Additive pattern databases for the water distribution problem.
+
+The vases are split into disjoint patterns. For each pattern an abstract
+problem only tracks the levels of its vases, and its cost-to-goal is computed
+for every abstract state by a backward Dijkstra search from the abstract goal.
+Actions are charged so that the abstract costs add up to at most the real
+cost: an action whose vases are both in the pattern costs what it really
+costs, one between a vase of the pattern and an outside vase costs half of it
+(the other half goes to the outside vase's pattern), and the outside vase is
+assumed to hold whatever level makes the action possible. The sum over the
+patterns is therefore an admissible and consistent heuristic.
+
+Tables are flat arrays of doubles saved in a file named after the board and
+the patterns, so later runs on the same board map the file instead of
+building the table again.
+"""
+import hashlib
+import heapq
+import os
+import tempfile
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+infinity = float('inf')
+
+DEFAULT_DIRECTORY = os.environ.get('WATERPUMP_PDB_DIR',
+                                   os.path.join(tempfile.gettempdir(), 'waterpump-pdb'))
+
+# Version of the tables, part of their file names: change it whenever the
+# abstraction or the split of the costs between patterns changes, so that
+# the tables already on disk are not used any more
+FORMAT = 1
+
+
+def make_patterns(layout, size=3, max_states=100000):
+    """Split the vases into disjoint patterns of at most size vases. Each
+    pattern starts from the first vase left and takes its nearest neighbours,
+    since actions between close vases are the ones worth keeping whole, as
+    long as the abstract space stays within max_states states."""
+    left = range(len(layout))
+    patterns = []
+    while left:
+        first = left.pop(0)
+        pattern = [first]
+        states = layout.cap[first] + 1
+        for y in sorted(left, key=lambda y: layout.dist[first][y]):
+            if len(pattern) == size:
+                break
+            if states * (layout.cap[y] + 1) <= max_states:
+                pattern.append(y)
+                states *= layout.cap[y] + 1
+        for y in pattern[1:]:
+            left.remove(y)
+        patterns.append(tuple(sorted(pattern)))
+    return patterns
+
+
+class Pattern:
+    """Abstract problem over the vases in pattern. Abstract states are lists
+    of levels for all the vases, where only those of the pattern matter."""
+
+    def __init__(self, layout, pattern):
+        self.layout = layout
+        self.pattern = pattern
+        self.outside = [y for y in xrange(len(layout)) if y not in pattern]
+        self.strides = []
+        self.size = 1
+        for i in pattern:
+            self.strides.append(self.size)
+            self.size *= layout.cap[i] + 1
+
+    def index(self, levels):
+        """Position in the table of the abstract state of levels."""
+        k = 0
+        for i, stride in zip(self.pattern, self.strides):
+            k += levels[i] * stride
+        return k
+
+    def levels(self, k):
+        levels = [0] * len(self.layout)
+        for i, stride in zip(self.pattern, self.strides):
+            levels[i] = (k // stride) % (self.layout.cap[i] + 1)
+        return levels
+
+    def transitions(self, levels):
+        """(index, cost) of the abstract successors of levels."""
+        layout = self.layout
+        cap, dist, pump_dist = layout.cap, layout.dist, layout.pump_dist
+        k = self.index(levels)
+        for i, stride in zip(self.pattern, self.strides):
+            v = levels[i]
+            if v != 0:
+                yield k - v * stride, 0
+            yield k + (cap[i] - v) * stride, pump_dist[i] * v + pump_dist[i] * cap[i]
+            for y, stride_y in zip(self.pattern, self.strides):
+                if y == i:
+                    continue
+                w = levels[y]
+                if w >= cap[i] - v and v != cap[i] and w != 0:
+                    yield (k + (cap[i] - v) * stride - (cap[i] - v) * stride_y,
+                           dist[i][y] * v + dist[i][y] * cap[i])
+                if v <= cap[y] - w and w != cap[y] and v != 0:
+                    yield k - v * stride + v * stride_y, dist[i][y] * v
+            for y in self.outside:
+                # i is carried to a vase of another pattern: takeFromI fills
+                # it, transferFromI empties it
+                if v != cap[i] and cap[y] >= cap[i] - v:
+                    yield k + (cap[i] - v) * stride, 0.5 * (dist[i][y] * v + dist[i][y] * cap[i])
+                if v != 0 and v <= cap[y]:
+                    yield k - v * stride, 0.5 * dist[i][y] * v
+                # a vase of another pattern is carried here and takes d units
+                # from i (it held cap[y] - d), or pours its d units into i
+                for d in xrange(1, cap[y] + 1):
+                    if d <= v:
+                        yield k - d * stride, 0.5 * dist[i][y] * (2 * cap[y] - d)
+                    if d <= cap[i] - v:
+                        yield k + d * stride, 0.5 * dist[i][y] * d
+
+    def build(self):
+        """Cost-to-goal of every abstract state (infinity where the abstract
+        goal cannot be reached), by Dijkstra on the reversed transitions."""
+        reverse = [[] for k in xrange(self.size)]
+        for k in xrange(self.size):
+            for child, cost in self.transitions(self.levels(k)):
+                reverse[child].append((k, cost))
+        table = array('d', [infinity]) * self.size
+        goal = self.index(self.layout.goal)
+        table[goal] = 0.0
+        queue = [(0.0, goal)]
+        while queue:
+            cost, k = heapq.heappop(queue)
+            if cost > table[k]:
+                continue
+            for parent, step in reverse[k]:
+                if cost + step < table[parent]:
+                    table[parent] = cost + step
+                    heapq.heappush(queue, (cost + step, parent))
+        return table
+
+
+def board_key(layout, patterns):
+    """Name of the table file for a board and its patterns (and FORMAT)."""
+    description = repr((FORMAT, layout.r, layout.c, layout.posX, layout.posY, layout.cap,
+                        layout.goal, patterns))
+    return hashlib.sha1(description.encode('utf-8')).hexdigest()
+
+
+def load_table(path, size):
+    """Map the table stored at path (read it whole if numpy is missing)."""
+    if numpy is not None:
+        return numpy.memmap(path, dtype='d', mode='r', shape=(size,))
+    table = array('d')
+    with open(path, 'rb') as stream:
+        table.fromfile(stream, size)
+    return table
+
+
+def save_table(table, path):
+    """Write table to path atomically, so a concurrent reader never maps a
+    half-written file."""
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    fd, temporary = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, 'wb') as stream:
+        table.tofile(stream)
+    os.rename(temporary, path)
+
+
+class PatternDatabase:
+    """Additive pattern database heuristic for a board (a VaseLayout)."""
+
+    def __init__(self, layout, size=3, directory=DEFAULT_DIRECTORY):
+        self.patterns = [Pattern(layout, p) for p in make_patterns(layout, size)]
+        self.tables = []
+        key = board_key(layout, [p.pattern for p in self.patterns])
+        for n, pattern in enumerate(self.patterns):
+            path = os.path.join(directory, '%s-%d.pdb' % (key, n))
+            if not os.path.exists(path):
+                save_table(pattern.build(), path)
+            self.tables.append(load_table(path, pattern.size))
+
+    def h(self, levels):
+        total = 0.0
+        for pattern, table in zip(self.patterns, self.tables):
+            total += float(table[pattern.index(levels)])
+        return total
+
+    def h_batch(self, levels):
+        """h of every row of a numpy array of levels (needs numpy)."""
+        total = numpy.zeros(len(levels))
+        for pattern, table in zip(self.patterns, self.tables):
+            index = levels[:, list(pattern.pattern)].dot(pattern.strides)
+            total += numpy.asarray(table)[index]
+        return total
@@ -1,10 +1,26 @@
 from __future__ import print_function
 from __future__ import generators
-from utils import PriorityQueue, infinity, memoize
+from array import array
+from collections import OrderedDict
+from heapq import heappush, heappop
+from checkpoint import load as load_checkpoint
+from closedSet import ClosedSet
+from metrics import Metrics, POLL_EVERY, print_sample
+from searchStats import effective_branching_factor, penetrance
+from utils import ExternalPriorityQueue, PriorityQueue, infinity, memoize
+import struct
 from waterPump import *
-import os
-import psutil
 import time
+
+# Expansions of the greedy dive that looks for a plan when a budget runs out
+DIVE_EXPANSIONS = 2000
+
+# States in the transposition table of idastar_search by default. Without
+# one, the zero-cost empty moves, which the threshold never limits, make the
+# depth-first search go through every interleaving of them
+TABLE_SIZE = 1000000
+
+
 class Node:
     """A node in a search tree. Contains a pointer to the parent (the node
     that this is a successor of) and to the actual state for this node. Note
@@ -32,7 +48,7 @@ class Node:
         if hasattr(self, 'f'):
             return "\n<Node: depth=%d, action=%s, path_cost=%d, h=%d\n\n%s\n>" % (
                                                               self.depth,
-                                                              self.action,
+                                                              action_name(self.action),
                                                               self.path_cost,
                                                               self.h,
                                                               self.state)
@@ -46,7 +62,8 @@ class Node:
         """Return a list of nodes reachable from this node."""
         return [Node(next_state, i, j, self, action,
                      problem.path_cost(self.path_cost, self.state, action, next_state))
-                for (action, next_state, i, j) in problem.successor(self.state)]
+                for (action, next_state, i, j) in problem.successor(self.state, self.action,
+                                                                     self.i, self.j)]
 
     def path(self):
         """ Create a list of nodes from the root to this node."""
@@ -68,120 +85,701 @@ class Node:
         return hash(self.state)
 
 
-def graph_search(problem, frontier):
+class SearchResult:
+    """What a search returns when it does not find a solution. status is
+    'no solution' when the search space was exhausted, or the limit of the
+    Budget that ran out ('timeout' or 'memory'); lower_bound is the smallest
+    f on the frontier, a lower bound on the cost of a solution when h is
+    admissible (infinity if there is none); incumbent is a goal Node found
+    by greedy_dive from the frontier, or None; stats are the figures of the
+    search, also left in problem.stats. It is false in a boolean context."""
+
+    def __init__(self, status, lower_bound=infinity, incumbent=None, stats=None):
+        self.status = status
+        self.lower_bound = lower_bound
+        self.incumbent = incumbent
+        self.stats = stats if stats is not None else OrderedDict()
+
+    def __nonzero__(self):
+        return False
+
+    def __repr__(self):
+        return '<SearchResult: %s, lower_bound=%r, incumbent=%s>' % (
+            self.status, self.lower_bound,
+            None if self.incumbent is None else self.incumbent.path_cost)
+
+
+class NodeArena:
+    """Search tree stored as parallel typed arrays instead of Node objects.
+    A node is an integer handle k: its parent is parent[k] (-1 for the root),
+    it was reached by action[k] (-1 for the root) on vases i[k], j[k], and it
+    has depth[k], g[k], h[k] and f[k]; states[k] is its state. A node costs
+    about 40 bytes besides its state, against several hundred for a Node with
+    its attribute dictionary."""
+
+    def __init__(self):
+        self.parent = array('l')
+        self.action = array('b')
+        self.i = array('h')
+        self.j = array('h')
+        self.depth = array('l')
+        self.g = array('d')
+        self.h = array('d')
+        self.f = array('d')
+        self.states = []
+
+    def __len__(self):
+        return len(self.states)
+
+    def add(self, state, parent, action, i, j, g):
+        """Store a node (h and f still 0) and return its handle."""
+        self.parent.append(parent)
+        self.action.append(-1 if action is None else action)
+        self.i.append(i)
+        self.j.append(j)
+        self.depth.append(0 if parent < 0 else self.depth[parent] + 1)
+        self.g.append(g)
+        self.h.append(0.0)
+        self.f.append(0.0)
+        self.states.append(state)
+        return len(self.states) - 1
+
+    def path(self, k):
+        """Handles from node k back to the root, by walking the parents."""
+        result = []
+        while k >= 0:
+            result.append(k)
+            k = self.parent[k]
+        return result
+
+    def node(self, k):
+        """Node k as a chain of Node objects, for the callers of the searches."""
+        node = None
+        for k in reversed(self.path(k)):
+            action = self.action[k]
+            node = Node(self.states[k], self.i[k], self.j[k], node,
+                        None if action < 0 else action, self.g[k])
+            node.h = self.h[k]
+            node.f = self.f[k]
+        return node
+
+
+class NodeView(object):
+    """Read-only Node-like view of node k of an arena, so that heuristics
+    written against Node (e.g. WaterPump.incremental_h) work on handles.
+    Views are made for a single call and never stored."""
+
+    __slots__ = ('arena', 'k')
+
+    def __init__(self, arena, k):
+        self.arena = arena
+        self.k = k
+
+    state = property(lambda self: self.arena.states[self.k])
+    i = property(lambda self: self.arena.i[self.k])
+    j = property(lambda self: self.arena.j[self.k])
+    path_cost = property(lambda self: self.arena.g[self.k])
+    depth = property(lambda self: self.arena.depth[self.k])
+    h = property(lambda self: self.arena.h[self.k])
+
+    @property
+    def parent(self):
+        parent = self.arena.parent[self.k]
+        return None if parent < 0 else NodeView(self.arena, parent)
+
+
+class NodeCodec:
+    """Serialized form of the nodes of a problem, for ExternalPriorityQueue:
+    the key of the state (see Problem.state_key), g, h, f, the action and a
+    number standing for the parent. Parents stay in memory, in parents, for
+    as long as some of their children are on disk."""
+
+    RECORD = struct.Struct('<dddbhhq')
+
+    def __init__(self, problem):
+        self.problem = problem
+        self.parents = {}
+        self.children = {}
+
+    def encode(self, node):
+        parent = node.parent
+        number = 0
+        if parent is not None:
+            number = id(parent)
+            self.parents[number] = parent
+            self.children[number] = self.children.get(number, 0) + 1
+        action = -1 if node.action is None else node.action
+        return self.RECORD.pack(node.path_cost, getattr(node, 'h', -infinity), node.f,
+                                action, node.i, node.j, number) + \
+            ('%x' % self.problem.state_key(node.state))
+
+    def decode(self, data):
+        g, h, f, action, i, j, number = self.RECORD.unpack(data[:self.RECORD.size])
+        parent = None
+        if number:
+            parent = self.parents[number]
+            self.children[number] -= 1
+            if not self.children[number]:
+                del self.parents[number], self.children[number]
+        state = self.problem.state_from_key(int(data[self.RECORD.size:], 16))
+        node = Node(state, i, j, parent, None if action < 0 else action, g)
+        if h != -infinity:
+            node.h = h
+        node.f = f
+        return node
+
+
+def graph_search(problem, frontier, evaluate=None, metrics=None, closed=None,
+                 checkpoint=None, snapshot=None, budget=None):
     """Search through the successors of a problem to find a goal.
-    The argument fringe should be an empty queue.
-    If two paths reach a state, only use the best one."""
-    closed = {}
-    frontier.append(Node(problem.initial, problem.i, problem.j))
+    The argument fringe should be an empty queue. If given, evaluate is
+    called with the list of children of each expansion that are about to
+    enter the frontier, before they do. Progress goes to metrics (a
+    metrics.Metrics, also left in problem.metrics).
+    If two paths reach a state, only use the best one: closed (a closedSet
+    backend, in memory by default) maps the key of every generated state to
+    the cheapest path cost found so far and whether it was expanded, and a
+    child that does not improve on it is dropped before it enters the
+    frontier. A child that improves on an already expanded state reopens it,
+    which keeps the search correct with inconsistent heuristics. A frontier
+    with keeps_duplicates (an ExternalPriorityQueue) keeps the worse copy
+    when a cheaper path to a queued state is found: superseded maps those
+    states to the cheaper g and the number of worse copies still queued, so
+    that they are skipped when popped without asking closed.
+    A checkpoint.Checkpoint, if given, takes snapshots of the search from
+    time to time; graph_search continues the one in snapshot (loaded with
+    checkpoint.load) instead of starting from the initial state.
+    With a metrics.Budget the search stops when it runs out and returns a
+    SearchResult with the smallest f on the frontier and the plan found by
+    a greedy dive from the node that has it, if any."""
+    metrics = problem.metrics = metrics or Metrics()
+    if not problem.solvable:
+        return search_failure(problem, 'no solution', 0, 0)
+    if budget is not None:
+        budget.start()
+    closed = closed if closed is not None else ClosedSet()
+    key = problem.state_key
     max_depth = 0
     counter = 0
+    generated = 0
+    duplicates = 0
+    reopened = 0
+    frontier_peak = 1
+    keeps_duplicates = getattr(frontier, 'keeps_duplicates', False)
+    superseded = {}
+    if snapshot is None:
+        root = Node(problem.initial, problem.i, problem.j)
+        closed.put(key(root.state), root.path_cost)
+        frontier.append(root)
+    else:
+        for state_key, g, expanded in snapshot.closed:
+            closed.put(state_key, g, expanded)
+        frontier.extend(snapshot.frontier)
+        counters = snapshot.counters
+        max_depth, counter, generated = counters['depth'], counters['expansions'], counters['generations']
+        duplicates, reopened = counters['duplicates'], counters['reopened']
+        frontier_peak = counters['frontier_peak']
+        problem.pruned, problem.dead = counters['pruned'], counters['dead']
+        metrics.update(heuristic_calls=counters['heuristic_calls'])
+
+    def progress():
+        return dict(expansions=counter, generations=generated, duplicates=duplicates,
+                    reopened=reopened, frontier=len(frontier), frontier_peak=frontier_peak,
+                    depth=max_depth)
+
     while frontier:
         node = frontier.pop()
-        # Print some information about search progress
+        node_key = key(node.state)
+        if superseded:
+            stale = superseded.get(node_key)
+            if stale is not None and node.path_cost > stale[0]:
+                if stale[1] == 1:
+                    del superseded[node_key]
+                else:
+                    superseded[node_key] = (stale[0], stale[1] - 1)
+                continue
         if node.depth > max_depth:
             max_depth = node.depth
-            if max_depth < 50 or max_depth % 1000 == 0:
-                pid = os.getpid()
-                py = psutil.Process(pid)
-                memory_use = py.memory_info()[0] / 1024 / 1024
-                print('Reached depth', max_depth,
-                      'Open len', len(frontier),
-                      'Memory used (MBytes)', memory_use)
 
         if problem.goal_test(node.state):
-            print('\n**************** Stats:\nTotal nodes expanded :', counter)
-            print('Solution depth :', node.depth)
-            print('Penetrance :', float(node.depth)/counter)
-            print('Effective branching factor ~ ', effective_branchingf(counter, node.depth))
-            print('Path cost :', node.path_cost, '\n\n**************** Solution:\n')
+            metrics.update(**progress())
+            metrics.sample()
+            report_stats(problem, node, counter, ('duplicates_suppressed', duplicates),
+                         ('nodes_reopened', reopened), ('frontier_peak', frontier_peak))
             return node
-        serial = node.state.__str__()
-        if serial not in closed:
-            closed[serial] = True
-            counter += 1
-            frontier.extend(node.expand(problem))
-    return "Solution not found"
+        closed.put(node_key, node.path_cost, True)
+        counter += 1
+        if not counter % POLL_EVERY:
+            metrics.poll(**progress())
+        expanded = node.expand(problem)
+        generated += len(expanded)
+        keys = [key(child.state) for child in expanded]
+        batch = {}
+        children = []
+        for child, child_key, entry in zip(expanded, keys, closed.get_many(keys)):
+            entry = batch.get(child_key, entry)
+            if entry is not None and entry[0] <= child.path_cost:
+                duplicates += 1
+                continue
+            if entry is not None and entry[1]:
+                reopened += 1
+            elif entry is not None and keeps_duplicates:
+                superseded[child_key] = (child.path_cost, superseded.get(child_key, (0, 0))[1] + 1)
+            closed.put(child_key, child.path_cost)
+            batch[child_key] = (child.path_cost, False)
+            children.append(child)
+        if evaluate is not None and children:
+            evaluate(children)
+        frontier.extend(children)
+        frontier_peak = max(frontier_peak, len(frontier))
+        if counter % POLL_EVERY:
+            continue
+        if checkpoint is not None and checkpoint.due():
+            checkpoint.save(problem, frontier, closed,
+                            dict(progress(), pruned=getattr(problem, 'pruned', 0),
+                                 dead=getattr(problem, 'dead', 0),
+                                 heuristic_calls=metrics.counters['heuristic_calls']))
+        status = budget is not None and frontier and budget.exceeded()
+        if status:
+            metrics.update(**progress())
+            metrics.sample()
+            best = frontier.pop()
+            return search_failure(problem, status, counter, max_depth, frontier.f(best),
+                                  greedy_dive(problem, best),
+                                  ('duplicates_suppressed', duplicates), ('nodes_reopened', reopened),
+                                  ('frontier_peak', frontier_peak), ('frontier', len(frontier) + 1))
+    metrics.update(**progress())
+    metrics.sample()
+    return search_failure(problem, 'no solution', counter, max_depth, infinity, None,
+                          ('duplicates_suppressed', duplicates), ('nodes_reopened', reopened),
+                          ('frontier_peak', frontier_peak))
+
+
+def greedy_dive(problem, node, limit=DIVE_EXPANSIONS):
+    """Look for a goal below node with greedy best-first search on
+    problem.dive_h (problem.h if it has none), expanding at most limit
+    nodes; the goal Node, or None."""
+    h = getattr(problem, 'dive_h', None) or problem.h
+    key = problem.state_key
+    seen = set([key(node.state)])
+    frontier = PriorityQueue(min, lambda n: (h(n), n.path_cost))
+    frontier.append(node)
+    for k in xrange(limit):
+        if not frontier:
+            break
+        node = frontier.pop()
+        if problem.goal_test(node.state):
+            return node
+        for child in node.expand(problem):
+            child_key = key(child.state)
+            if child_key not in seen:
+                seen.add(child_key)
+                frontier.append(child)
+    return None
+
+
+def problem_stats(problem):
+    """(key, value) pairs of the problem's own counters that apply to it."""
+    extra = ()
+    if getattr(problem, 'partial_order', False):
+        extra += (('successors_pruned', problem.pruned),)
+    if getattr(problem, 'solvability', None) is not None and problem.solvability.needed:
+        extra += (('dead_states_pruned', problem.dead),)
+    return extra
+
+
+def report_stats(problem, node, counter, *extra):
+    """Print the Stats block for the solution node found after expanding
+    counter nodes, and keep the same figures in problem.stats so that they
+    can be collected programmatically. extra are (key, value) pairs specific
+    to the search."""
+    stats = OrderedDict([('nodes_expanded', counter),
+                         ('depth', node.depth),
+                         ('penetrance', penetrance(counter, node.depth)),
+                         ('ebf', effective_branchingf(counter, node.depth))])
+    extra += problem_stats(problem)
+    stats.update(extra)
+    stats['path_cost'] = node.path_cost
+    problem.stats = stats
+    print('\n**************** Stats:\nTotal nodes expanded :', counter)
+    print('Solution depth :', node.depth)
+    print('Penetrance :', stats['penetrance'])
+    print('Effective branching factor ~ ', stats['ebf'])
+    for key, value in extra:
+        print(key.replace('_', ' ').capitalize(), ':', value)
+    print('Path cost :', node.path_cost, '\n\n**************** Solution:\n')
+
+
+def search_failure(problem, status, counter, depth, lower_bound=infinity, incumbent=None, *extra):
+    """Print the Stats block of a search that stopped with status after
+    expanding counter nodes, down to depth, keep them in problem.stats and
+    return them in a SearchResult."""
+    stats = OrderedDict([('nodes_expanded', counter), ('depth', depth)])
+    stats.update(extra + problem_stats(problem))
+    stats['lower_bound'] = lower_bound
+    if incumbent is not None:
+        stats['incumbent_cost'] = incumbent.path_cost
+    problem.stats = stats
+    print('\n**************** Stats:\nSearch stopped :', status)
+    for key, value in stats.items():
+        print(key.replace('_', ' ').capitalize(), ':', value)
+    return SearchResult(status, lower_bound, incumbent, stats)
 
 # ______________________________________________________________________________
 # Informed (Heuristic) Search
 
 
-def best_first_graph_search(problem, f):
+def best_first_graph_search(problem, f, evaluate=None, metrics=None, closed=None,
+                            frontier_budget=None, directory=None, checkpoint=None, snapshot=None,
+                            budget=None):
     """Search the nodes with the lowest f scores first.
     You specify the function f(node) that you want to minimize; for example,
     if f is a heuristic estimate to the goal, then we have greedy best
     first search; if f is node.depth then we have depth-first search.
     There is a subtlety: the line "f = memoize(f, 'f')" means that the f
     values will be cached on the nodes as they are computed. So after doing
-    a best first search you can examine the f values of the path returned."""
+    a best first search you can examine the f values of the path returned.
+    With frontier_budget, the frontier is an ExternalPriorityQueue that keeps
+    at most that many nodes in memory and spills the others to directory.
+    checkpoint, snapshot and budget are passed to graph_search; a checkpoint
+    only works with the frontier in memory."""
     f = memoize(f, 'f')
-    return graph_search(problem, PriorityQueue(min, f))
-
-
-def astar_search(problem, h=None):
+    if frontier_budget is None:
+        try:
+            return graph_search(problem, PriorityQueue(min, f), evaluate, metrics, closed,
+                                checkpoint, snapshot, budget)
+        finally:
+            if checkpoint is not None:
+                checkpoint.wait()
+    if checkpoint is not None or snapshot is not None:
+        raise ValueError('checkpoints need the frontier in memory (no frontier_budget)')
+    codec = NodeCodec(problem)
+    frontier = ExternalPriorityQueue(f, codec.encode, codec.decode, frontier_budget, directory)
+    try:
+        return graph_search(problem, frontier, evaluate, metrics, closed, budget=budget)
+    finally:
+        frontier.close()
+
+
+def astar_search(problem, h=None, batch=False, metrics=None, closed=None,
+                 frontier_budget=None, directory=None, checkpoint=None, resume=None,
+                 budget=None):
     """A* search is best-first graph search with f(n) = g(n)+h(n).
     You need to specify the h function when you call astar_search.
-    Uses the pathmax trick: f(n) = max(f(n), g(n)+h(n))."""
-    h = h or problem.h
+    Uses the pathmax trick: f(n) = max(f(n), g(n)+h(n)).
+    With batch=True (and the problem's own h) the heuristic of the new
+    children of an expansion is evaluated at once by problem.batch_h, on an
+    array of their levels, and stored in their h slot where the memoized h
+    finds it. Calls to the heuristic are counted in metrics. closed is the
+    closed-set backend of graph_search (e.g. a closedSet.SpillingClosedSet
+    for instances whose closed set does not fit in memory), and
+    frontier_budget the number of frontier nodes kept in memory (see
+    best_first_graph_search). With a checkpoint.Checkpoint the search is
+    saved from time to time, and resume (the path of a saved one) continues
+    that search instead of starting a new one: problem has to be the same
+    problem, h the same heuristic. With a metrics.Budget of time and
+    memory the search stops when it runs out and returns a SearchResult
+    (see graph_search)."""
+    snapshot = None if resume is None else load_checkpoint(resume, problem)
+    metrics = metrics or Metrics()
+    evaluate = None
+    if batch and h is None:
+        def evaluate(children):
+            metrics.count('heuristic_calls', len(children))
+            values = problem.batch_h([child.state for child in children])
+            for child, value in zip(children, values.tolist()):
+                child.h = value
+    h = metrics.counting('heuristic_calls', h or problem.h)
     h = memoize(h, 'h')
 
     def f(n):
         return max(getattr(n, 'f', -infinity), n.path_cost + h(n))
 
-    return best_first_graph_search(problem, f)
+    return best_first_graph_search(problem, f, evaluate, metrics, closed,
+                                   frontier_budget, directory, checkpoint, snapshot, budget)
+
+
+def arena_astar_search(problem, h=None, metrics=None, deferred=False, bound=None):
+    """A* search (with the same duplicate handling as graph_search) over a
+    NodeArena: the frontier is a heap of (f, counter, handle, evaluated) and
+    best maps every generated state to the handle of its cheapest node, so
+    entries whose handle is no longer best are stale and skipped. Only the
+    solution path is turned into Node objects, at the end.
+    With deferred=True h is evaluated when a node is popped instead of when
+    it is generated: children are queued with the parent's f (or their g
+    plus bound(node), a cheap heuristic, if given) and a popped node whose
+    g + h turns out larger goes back in the queue with that f. Children that
+    are never popped never cost a heuristic call. With an admissible h (and
+    bound) the result is still optimal."""
+    metrics = problem.metrics = metrics or Metrics()
+    if not problem.solvable:
+        return search_failure(problem, 'no solution', 0, 0)
+    h = metrics.counting('heuristic_calls', h or problem.h)
+    arena = NodeArena()
+    g, f = arena.g, arena.f
+    root = arena.add(problem.initial, -1, None, problem.i, problem.j, 0)
+    arena.h[root] = f[root] = h(NodeView(arena, root))
+    best = {problem.initial: root}
+    closed = set()
+    heap = [(f[root], 0, root, True)]
+    pushed = 0
+    max_depth = 0
+    counter = 0
+    generated = 0
+    duplicates = 0
+    reopened = 0
+    open_count = 1
+    frontier_peak = 1
+
+    def progress():
+        return dict(expansions=counter, generations=generated, duplicates=duplicates,
+                    reopened=reopened, frontier=open_count, frontier_peak=frontier_peak,
+                    depth=max_depth, nodes=len(arena))
+
+    while heap:
+        key, _, k, evaluated = heappop(heap)
+        state = arena.states[k]
+        if best[state] != k:
+            continue
+        if not evaluated and not problem.goal_test(state):
+            arena.h[k] = value = h(NodeView(arena, k))
+            if g[k] + value > key:
+                f[k] = g[k] + value
+                pushed += 1
+                heappush(heap, (f[k], pushed, k, True))
+                continue
+        open_count -= 1
+        max_depth = max(max_depth, arena.depth[k])
+        if problem.goal_test(state):
+            metrics.update(**progress())
+            metrics.sample()
+            node = arena.node(k)
+            report_stats(problem, node, counter, ('duplicates_suppressed', duplicates),
+                         ('nodes_reopened', reopened), ('frontier_peak', frontier_peak))
+            return node
+        closed.add(state)
+        counter += 1
+        if not counter % POLL_EVERY:
+            metrics.poll(**progress())
+        for action, child, i, j in problem.successor(state, arena.action[k], arena.i[k], arena.j[k]):
+            generated += 1
+            cost = problem.path_cost(g[k], state, action, child)
+            old = best.get(child)
+            if old is not None and g[old] <= cost:
+                duplicates += 1
+                continue
+            if child in closed:
+                closed.remove(child)
+                reopened += 1
+                open_count += 1
+            elif old is None:
+                open_count += 1
+            c = arena.add(child, k, action, i, j, cost)
+            if not deferred:
+                arena.h[c] = value = h(NodeView(arena, c))
+                f[c] = cost + value
+            elif bound is None:
+                f[c] = max(f[k], cost)
+            else:
+                f[c] = cost + bound(NodeView(arena, c))
+            best[child] = c
+            pushed += 1
+            heappush(heap, (f[c], pushed, c, not deferred))
+        frontier_peak = max(frontier_peak, open_count)
+    metrics.update(**progress())
+    metrics.sample()
+    return search_failure(problem, 'no solution', counter, max_depth, infinity, None,
+                          ('duplicates_suppressed', duplicates), ('nodes_reopened', reopened),
+                          ('frontier_peak', frontier_peak))
+
+
+def deferred_astar_search(problem, h=None, bound=None, metrics=None):
+    """arena_astar_search with deferred heuristic evaluation. bound defaults
+    to the problem's bound_h, if it has one."""
+    bound = bound or getattr(problem, 'bound_h', None)
+    return arena_astar_search(problem, h, metrics, deferred=True, bound=bound)
+
+
+def idastar_search(problem, h=None, growth=0.5, table_size=TABLE_SIZE, metrics=None):
+    """IDA* search: repeated depth-first searches that prune children with
+    f(n) = g(n)+h(n) above a threshold, so memory is linear in the solution
+    depth. Costs are real valued, so raising the threshold only to the
+    smallest f that was pruned could add a handful of nodes per iteration;
+    it grows to at least (1 + growth) times the previous one instead. The last
+    iteration can then contain several solutions, so once one is found the
+    iteration goes on as a branch and bound on its cost, and the result is
+    still optimal with an admissible h. With table_size > 0 (the default,
+    see TABLE_SIZE) a transposition table keeps, for up to that many states, the cheapest g they were reached
+    with in the current iteration, and a state reached again with no better
+    g is not searched a second time. Progress goes to metrics, where
+    duplicates are the children dropped as already on the path or in the
+    table."""
+    metrics = problem.metrics = metrics or Metrics()
+    if not problem.solvable:
+        return search_failure(problem, 'no solution', 0, 0)
+    h = metrics.counting('heuristic_calls', h or problem.h)
+    h = memoize(h, 'h')
+    root = Node(problem.initial, problem.i, problem.j)
+    threshold = h(root)
+    counter = 0
+    generated = 0
+    duplicates = 0
+    iterations = 0
+
+    def progress():
+        return dict(expansions=counter, generations=generated, duplicates=duplicates,
+                    frontier=len(path), depth=len(path), iterations=iterations, threshold=threshold)
+
+    if problem.goal_test(root.state):
+        report_stats(problem, root, counter, ('iterations', iterations))
+        return root
+    while True:
+        iterations += 1
+        incumbent = None
+        next_threshold = infinity
+        table = {}
+        path = [root]
+        on_path = set([root.state])
+        stack = [iter(root.expand(problem))]
+        counter += 1
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+                on_path.remove(path.pop().state)
+                continue
+            generated += 1
+            if child.state in on_path:
+                duplicates += 1
+                continue
+            f = child.path_cost + h(child)
+            if incumbent is not None and f >= incumbent.path_cost:
+                continue
+            if f > threshold:
+                next_threshold = min(next_threshold, f)
+                continue
+            if table_size:
+                g = table.get(child.state)
+                if g is not None and g <= child.path_cost:
+                    duplicates += 1
+                    continue
+                if g is not None or len(table) < table_size:
+                    table[child.state] = child.path_cost
+            if problem.goal_test(child.state):
+                incumbent = child
+                continue
+            counter += 1
+            if not counter % POLL_EVERY:
+                metrics.poll(**progress())
+            path.append(child)
+            on_path.add(child.state)
+            stack.append(iter(child.expand(problem)))
+        if incumbent is not None or next_threshold == infinity:
+            metrics.update(**progress())
+            metrics.sample()
+        if incumbent is not None:
+            report_stats(problem, incumbent, counter, ('iterations', iterations),
+                         ('final_threshold', threshold))
+            return incumbent
+        if next_threshold == infinity:
+            return search_failure(problem, 'no solution', counter, 0, infinity, None,
+                                  ('iterations', iterations), ('final_threshold', threshold))
+        threshold = max(next_threshold, threshold * (1 + growth))
+
+
+def arastar_search(problem, h=None, w=3.0, step=0.5, time_limit=None, metrics=None, admissible=None):
+    """Anytime Repairing A* (ARA*). Runs weighted A* with f(n) = g(n)+w*h(n),
+    which finds a solution quickly, then lowers w by step and continues from
+    the same search: states whose g improved after they had been expanded are
+    kept aside (INCONS) and requeued with the open list for the next round,
+    instead of starting over. This is a generator: each time the solution or
+    its bound improves it yields (node, bound), where node.path_cost is
+    guaranteed to be at most bound times the optimal cost (for a consistent
+    h). There is no such guarantee unless h is admissible (by default,
+    problem.admissible when h is the problem's own), and bound is None then.
+    It stops when the bound reaches 1, after the round with w = 1, when the
+    frontier is exhausted or after time_limit seconds. Progress goes to
+    metrics."""
+    metrics = problem.metrics = metrics or Metrics()
+    if not problem.solvable:
+        return
+    if admissible is None:
+        admissible = h is None and getattr(problem, 'admissible', False)
+    h = metrics.counting('heuristic_calls', h or problem.h)
+    h = memoize(h, 'h')
+    start = time.time()
+    root = Node(problem.initial, problem.i, problem.j)
+    best_g = {root.state: root.path_cost}
+    incumbent = None
+    last_bound = infinity
+    last_cost = infinity
+    counter = 0
+    open_nodes = [root]
+    while True:
+        frontier = PriorityQueue(min, lambda n: n.path_cost + w * h(n))
+        frontier.extend(open_nodes)
+        closed = set()
+        incons = {}
+        while frontier:
+            if time_limit is not None and time.time() - start > time_limit:
+                return
+            node = frontier.pop()
+            if incumbent is not None and frontier.f(node) >= incumbent.path_cost:
+                frontier.append(node)
+                break
+            closed.add(node.state)
+            counter += 1
+            if not counter % POLL_EVERY:
+                metrics.poll(expansions=counter, frontier=len(frontier), w=w)
+            for child in node.expand(problem):
+                g = best_g.get(child.state)
+                if g is not None and g <= child.path_cost:
+                    continue
+                best_g[child.state] = child.path_cost
+                if problem.goal_test(child.state):
+                    if incumbent is None or child.path_cost < incumbent.path_cost:
+                        incumbent = child
+                elif child.state in closed:
+                    incons[child.state] = child
+                else:
+                    frontier.append(child)
+        if incumbent is None:
+            return
+        open_nodes = list(frontier) + list(incons.values())
+        bound = None
+        if admissible:
+            if open_nodes:
+                lower = min(n.path_cost + h(n) for n in open_nodes)
+                bound = min(w, incumbent.path_cost / lower) if lower > 0 else w
+            else:
+                bound = 1.0
+            bound = max(bound, 1.0)
+        if incumbent.path_cost < last_cost or (bound is not None and bound < last_bound):
+            last_cost = incumbent.path_cost
+            if bound is not None:
+                last_bound = bound
+            metrics.update(expansions=counter, frontier=len(open_nodes), w=w, bound=bound)
+            metrics.sample()
+            print('w', w, 'Path cost', incumbent.path_cost, 'Bound', bound,
+                  'Total nodes expanded', counter, 'Elapsed', time.time() - start)
+            yield incumbent, bound
+        if (bound is not None and bound <= 1.0) or w <= 1.0:
+            return
+        w = max(1.0, w - step)
+
+
+# Search entry points that take a problem and return a solution node
+SEARCHES = {'astar': astar_search,
+            'astar_arena': arena_astar_search,
+            'astar_deferred': deferred_astar_search,
+            'idastar': idastar_search}
 
 # ______________________________________________________________________________
-# Peter Norvig - With small changes/additions
 
 
 def effective_branchingf(exp, depth):
-    """Function to calculate effective branching factor b*."""
-    return bisect(exp, depth)
-
-
-def truncate(f, n):
-    """Truncates/pads a float f to n decimal places without rounding;
-    added because float overflow."""
-    s = '{}'.format(f)
-    if 'e' in s or 'E' in s:
-        return '{0:.{1}f}'.format(f, n)
-    i, p, d = s.partition('.')
-    return '.'.join([i, (d+'0'*n)[:n]])
-
-
-def exp(value, e):
-    """exponential reformulation that uses truncate function."""
-    i = 0
-    val = 1
-
-    while i < e:
-        val *= value
-        val = float(truncate(val, 2))
-        i += 1
-    return val
-
-
-def bisect(nodes, depth, lo=0, hi=3):
-    """Bisect method to find a reasonable approximation."""
-    error = float(nodes)/100
-    while lo < hi:
-        mid = (float(lo+hi)/2)
-        i = 0
-        x = mid
-        counter = 0
-        while i <= depth:
-            e = exp(x, i)
-            counter += e
-            i += 1
-        if abs(counter - (nodes + 1)) < error:
-            return mid
-        elif counter > nodes + 1:
-            hi = mid
-        else:
-            lo = mid
-
-    return -1
+    """Function to calculate effective branching factor b* (see searchStats)."""
+    return effective_branching_factor(exp, depth)
 
 
 def trace():
@@ -225,9 +823,11 @@ def trace():
         return print("Error: invalid number")
     searcher = astar_search
     start = time.time()
-    solution = searcher(type)
+    solution = searcher(type, metrics=Metrics([print_sample]))
     elapsed = time.time() - start
     print('Elapsed time:', elapsed, 'seconds')
+    if not solution:
+        return print(solution)
     path = solution.path()
     path.reverse()
     print(path)
@@ -0,0 +1,101 @@
+"""Figures of merit of search runs.
+
+The effective branching factor b* of a run that expanded N nodes to find a
+solution at depth d is the branching factor of the uniform tree of depth d
+with N + 1 nodes:
+
+    1 + b* + b*^2 + ... + b*^d = N + 1
+
+The left side is increasing in b* >= 0 and b*^d <= N + 1, so the root lies
+in [0, max(1, (N + 1) ** (1 / d))] and bisection finds it to machine
+precision. The sum is evaluated as expm1((d + 1) * log1p(x)) / x with
+x = b* - 1, which stays accurate near b* = 1 and cannot overflow inside the
+bracket. effective_branching_factors solves many runs at once on numpy
+arrays, and summarize adds all the figures to a list of result dicts.
+"""
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Bisection steps: enough to shrink any bracket below the double precision
+ITERATIONS = 100
+
+
+def tree_size(b, depth):
+    """1 + b + ... + b^depth."""
+    x = b - 1.0
+    if x == 0:
+        return depth + 1.0
+    return math.expm1((depth + 1) * math.log1p(x)) / x
+
+
+def effective_branching_factor(nodes, depth):
+    """b* of a run that expanded nodes nodes and found a solution at depth
+    (0.0 for a solution at the root, where it is not defined)."""
+    if depth <= 0:
+        return 0.0
+    lo, hi = 0.0, max(1.0, (nodes + 1.0) ** (1.0 / depth))
+    for k in xrange(ITERATIONS):
+        mid = (lo + hi) / 2
+        if mid == lo or mid == hi:
+            break
+        if tree_size(mid, depth) < nodes + 1:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2
+
+
+def effective_branching_factors(nodes, depths):
+    """effective_branching_factor over numpy arrays of nodes and depths."""
+    nodes = numpy.asarray(nodes, dtype=float)
+    depths = numpy.asarray(depths, dtype=float)
+    valid = depths > 0
+    d = numpy.where(valid, depths, 1.0)
+    lo = numpy.zeros(nodes.shape)
+    hi = numpy.maximum(1.0, (nodes + 1.0) ** (1.0 / d))
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        for k in xrange(ITERATIONS):
+            mid = (lo + hi) / 2
+            x = mid - 1.0
+            size = numpy.where(x == 0, d + 1.0, numpy.expm1((d + 1) * numpy.log1p(x)) / x)
+            below = size < nodes + 1
+            lo = numpy.where(below, mid, lo)
+            hi = numpy.where(below, hi, mid)
+    return numpy.where(valid, (lo + hi) / 2, 0.0)
+
+
+def penetrance(nodes, depth):
+    """Fraction of the expanded nodes that lie on the solution path."""
+    return float(depth) / max(nodes, 1)
+
+
+def summarize(results, baseline='WaterPump'):
+    """Add ebf, penetrance and expansions_per_sec to every solved result dict
+    (with nodes_expanded, depth and time), and cost_ratio and expanded_ratio
+    against the solved result of the baseline heuristic (uniform cost search)
+    on the same problem. All the runs are solved at once with numpy when it is
+    available. Returns results."""
+    solved = [r for r in results if r.get('status') == 'solved']
+    if not solved:
+        return results
+    nodes = [r['nodes_expanded'] for r in solved]
+    depths = [r['depth'] for r in solved]
+    if numpy is not None:
+        ebf = effective_branching_factors(nodes, depths).tolist()
+    else:
+        ebf = [effective_branching_factor(n, d) for n, d in zip(nodes, depths)]
+    base = dict((r['problem'], r) for r in solved if r['heuristic'] == baseline)
+    for r, b in zip(solved, ebf):
+        r['ebf'] = b
+        r['penetrance'] = penetrance(r['nodes_expanded'], r['depth'])
+        if 'time' in r:
+            r['expansions_per_sec'] = r['nodes_expanded'] / max(r['time'], 1e-9)
+        ucs = base.get(r['problem'])
+        if ucs is not None:
+            r['cost_ratio'] = r['path_cost'] / ucs['path_cost'] if ucs['path_cost'] else 1.0
+            r['expanded_ratio'] = float(r['nodes_expanded']) / max(ucs['nodes_expanded'], 1)
+    return results
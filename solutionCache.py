@@ -0,0 +1,115 @@
+"""Persistent cache of solved instances.
+
+Results are stored in a sqlite database, keyed by a canonical hash of the
+instance (board, pump and vases, whatever order the vases are listed in) and
+by the search and heuristic that solved it. Each entry keeps the actions of
+the plan, its cost and the search stats. A cached plan is replayed through
+WaterDistributionState.act before it is returned, and an entry that does not
+replay to a goal at the stored cost is dropped. When the entries take more
+than max_bytes, the least recently used ones are evicted.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from instances import DEFAULT_BOARD, DEFAULT_PUMP, make_vases
+from waterPump import VaseLayout, WaterDistributionState
+
+DEFAULT_PATH = os.environ.get('WATERPUMP_CACHE', 'solutions.sqlite')
+
+
+def canonical(instance):
+    """(key, order) for an instance: key hashes the board, the pump and the
+    vases sorted by position, and order[k] is the index in instance['vases']
+    of the k-th vase in that sorted order."""
+    vases = [(v['posX'], v['posY'], v.get('cap', 0), v.get('goal', 0), v.get('value', 0))
+             for v in instance['vases']]
+    order = sorted(xrange(len(vases)), key=lambda k: vases[k])
+    description = json.dumps([list(instance.get('board', DEFAULT_BOARD)),
+                              list(instance.get('pump', DEFAULT_PUMP)),
+                              [vases[k] for k in order]])
+    return hashlib.sha1(description.encode('utf-8')).hexdigest(), order
+
+
+def replay(instance, actions):
+    """Cost of applying actions ([name, i, j] lists) from the initial levels
+    of instance, or None if one is illegal or the last state is not a goal."""
+    board = instance.get('board', DEFAULT_BOARD)
+    pump = instance.get('pump', DEFAULT_PUMP)
+    vases = make_vases(instance)
+    state = WaterDistributionState(VaseLayout(vases, board[0], pump[0], pump[1]),
+                                   [v.value for v in vases])
+    cost = 0.0
+    for action, i, j in actions:
+        state = state.act(action, i, j)
+        if state is None:
+            return None
+        cost += state.cost
+    if state.mismatch != 0:
+        return None
+    return cost
+
+
+class SolutionCache:
+    """On-disk cache of plans, see the module docstring."""
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS solutions '
+                                '(key TEXT PRIMARY KEY, result TEXT, size INTEGER, used REAL)')
+        self.connection.commit()
+
+    def key(self, instance, search, heuristic):
+        key, order = canonical(instance)
+        return '%s/%s/%s' % (key, search, heuristic), order
+
+    def get(self, instance, search, heuristic):
+        """The cached result for instance, as a dict with actions (indices
+        of instance['vases']), path_cost and stats, or None."""
+        key, order = self.key(instance, search, heuristic)
+        row = self.connection.execute('SELECT result FROM solutions WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        result = json.loads(row[0])
+        result['actions'] = [[action, order[i], order[j]] for action, i, j in result['actions']]
+        cost = replay(instance, result['actions'])
+        if cost is None or abs(cost - result['path_cost']) > 1e-6 * max(1.0, cost):
+            self.connection.execute('DELETE FROM solutions WHERE key = ?', (key,))
+            self.connection.commit()
+            return None
+        self.connection.execute('UPDATE solutions SET used = ? WHERE key = ?', (time.time(), key))
+        self.connection.commit()
+        return result
+
+    def put(self, instance, search, heuristic, actions, path_cost, stats):
+        """Store the plan actions ([name, i, j] lists) found for instance."""
+        key, order = self.key(instance, search, heuristic)
+        position = dict((k, n) for n, k in enumerate(order))
+        result = json.dumps({'actions': [[action, position[i], position[j]] for action, i, j in actions],
+                             'path_cost': path_cost,
+                             'stats': stats})
+        self.connection.execute('INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?)',
+                                (key, result, len(result), time.time()))
+        self.evict()
+        self.connection.commit()
+
+    def evict(self):
+        """Drop the least recently used entries until they fit in max_bytes."""
+        total = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM solutions').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.connection.execute('SELECT key, size FROM solutions ORDER BY used').fetchall():
+            if total <= self.max_bytes:
+                break
+            self.connection.execute('DELETE FROM solutions WHERE key = ?', (key,))
+            total -= size
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM solutions').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,71 @@
+"""Solvability analysis of water distribution instances.
+
+For every vase an over-approximation of the levels it can ever hold is the
+fixpoint of: 0 and its capacity (empty and pump), its initial level, and the
+levels left by takeFromI and transferFromI between any level of one vase and
+any level of another. Every reachable state has its levels in these sets, so
+a goal level outside its vase's set means that the instance has no solution.
+
+The same test, started from a state instead of the initial levels, tells
+dead states (from which some goal level can no longer be reached) apart.
+The levels that matter are those outside the sets reachable from the empty
+vases, so the answer is memoized on them and the check is a dict lookup for
+most states.
+"""
+
+
+def closure(layout, seeds):
+    """Per-vase sets of levels reachable from the per-vase sets seeds
+    (over-approximated: the levels of different vases are not correlated)."""
+    cap = layout.cap
+    n = len(cap)
+    sets = [set(s) for s in seeds]
+    changed = True
+    while changed:
+        changed = False
+        for i in xrange(n):
+            for y in xrange(n):
+                if i == y:
+                    continue
+                new = set()
+                for vi in sets[i]:
+                    for vy in sets[y]:
+                        # takeFromI leaves y with vy - (cap[i] - vi)
+                        if vy >= cap[i] - vi and vi != cap[i] and vy != 0:
+                            new.add(vy - (cap[i] - vi))
+                        # transferFromI leaves y with vy + vi
+                        if vi <= cap[y] - vy and vy != cap[y] and vi != 0:
+                            new.add(vy + vi)
+                if not new <= sets[y]:
+                    sets[y] |= new
+                    changed = True
+    return sets
+
+
+def reachable_levels(layout, levels):
+    """Per-vase sets of levels that may be reached from levels."""
+    return closure(layout, [(0, c, v) for c, v in zip(layout.cap, levels)])
+
+
+class Solvability:
+    """Dead-state test for a board (a VaseLayout). needed is False when every
+    goal level is in the sets reachable from the empty vases: the sets from
+    any state contain those, so no state is found dead and there is nothing
+    to check."""
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.base = closure(layout, [(0, c) for c in layout.cap])
+        self.needed = any(g not in s for g, s in zip(layout.goal, self.base))
+        self.memo = {}
+
+    def feasible(self, levels):
+        """False if from levels some goal level can certainly not be reached."""
+        if not self.needed:
+            return True
+        key = tuple((i, v) for i, v in enumerate(levels) if v not in self.base[i])
+        result = self.memo.get(key)
+        if result is None:
+            sets = closure(self.layout, [s | set([v]) for s, v in zip(self.base, levels)])
+            result = self.memo[key] = all(g in s for g, s in zip(self.layout.goal, sets))
+        return result
@@ -1,5 +1,6 @@
 from __future__ import generators
 import operator, math, random, copy, sys, os.path, bisect
+import shutil, struct, tempfile
 from collections import deque
 from heapq import heappush, heappop
 # ______________________________________________________________________________
@@ -736,21 +737,132 @@ class FIFOQueue(Queue):
 class PriorityQueue(Queue):
     """A queue in which the minimum (or maximum) element (as determined by f and
     order) is returned first. If order is min, the item with minimum f(x) is
-    returned first; if order is max, then it is the item with maximum f(x)."""
+    returned first; if order is max, then it is the item with maximum f(x).
+    The queue is a binary heap of (key, counter, item) entries: the insertion
+    counter breaks ties, so items themselves are never compared. Equal items
+    (e.g. nodes with the same state) are queued once: appending one that is not
+    better than the queued one does nothing, appending a better one leaves the
+    old entry in the heap as stale and pop skips it (lazy deletion)."""
 
     def __init__(self, order=min, f=lambda x: x):
-        update(self, A=[], order=order, f=f)
+        update(self, A=[], order=order, f=f, best={}, counter=0)
 
     def append(self, item):
-        bisect.insort(self.A, (self.f(item), item))
+        key = self.f(item)
+        if self.order != min:
+            key = -key
+        queued = self.best.get(item)
+        if queued is not None and queued[0] <= key:
+            return
+        self.counter += 1
+        self.best[item] = (key, self.counter)
+        heappush(self.A, (key, self.counter, item))
 
     def __len__(self):
-        return len(self.A)
+        return len(self.best)
+
+    def __contains__(self, item):
+        return item in self.best
+
+    def __iter__(self):
+        """Iterate over the queued items, in no particular order."""
+        for key, count, item in self.A:
+            if self.best.get(item, (None, None))[1] == count:
+                yield item
 
     def pop(self):
-        if self.order == min:
-            return self.A.pop(0)[1]
-        else:
-            return self.A.pop()[1]
+        while self.A:
+            key, count, item = heappop(self.A)
+            if self.best.get(item, (None, None))[1] == count:
+                del self.best[item]
+                return item
+        raise IndexError('pop from empty priority queue')
+
+
+class ExternalPriorityQueue(Queue):
+    """A min PriorityQueue that keeps at most budget entries in memory. When
+    there are more, the entries with the largest keys are written, sorted, to
+    a run file in directory (a temporary one by default) and only the smallest
+    half stays in the heap. pop returns the smallest key overall: whenever the
+    head of a run is smaller than the top of the heap, the next block of that
+    run is read back, so runs are merged in as the keys popped grow.
+    Items go to disk as the strings returned by encode and come back through
+    decode. Unlike PriorityQueue, equal items are not merged: a worse copy of
+    an item is left in the queue and the caller has to skip it when popped."""
+
+    HEADER = struct.Struct('<dqI')
+
+    keeps_duplicates = True
+
+    def __init__(self, f, encode, decode, budget=1000000, directory=None):
+        update(self, A=[], f=f, encode=encode, decode=decode, budget=max(2, budget),
+               counter=0, runs=[], on_disk=0, spilled=0)
+        self.temporary = directory is None
+        self.directory = tempfile.mkdtemp(prefix='frontier-') if directory is None else directory
 
+    def append(self, item):
+        self.counter += 1
+        heappush(self.A, (self.f(item), self.counter, item))
+        if len(self.A) > self.budget:
+            self.spill()
 
+    def __len__(self):
+        return len(self.A) + self.on_disk
+
+    def spill(self):
+        """Write the larger half of the heap to a new sorted run."""
+        self.A.sort()
+        keep = self.budget // 2
+        path = os.path.join(self.directory, 'run-%d' % self.spilled)
+        with open(path, 'wb') as stream:
+            for key, count, item in self.A[keep:]:
+                data = self.encode(item)
+                stream.write(self.HEADER.pack(key, count, len(data)))
+                stream.write(data)
+        spilled = len(self.A) - keep
+        self.on_disk += spilled
+        self.spilled += spilled
+        del self.A[keep:]
+        run = [None, open(path, 'rb'), path]
+        self.runs.append(run)
+        self.advance(run)
+
+    def advance(self, run):
+        """Read the next entry of run into its head (None at the end)."""
+        header = run[1].read(self.HEADER.size)
+        if not header:
+            run[1].close()
+            os.remove(run[2])
+            self.runs.remove(run)
+            return
+        key, count, size = self.HEADER.unpack(header)
+        run[0] = (key, count, run[1].read(size))
+
+    def merge(self):
+        """Move entries from the runs to the heap until the heap holds the
+        smallest key, a block of budget // 4 entries at a time."""
+        while self.runs:
+            run = min(self.runs, key=lambda run: run[0][:2])
+            if self.A and self.A[0][:2] < run[0][:2]:
+                return
+            for k in xrange(max(1, self.budget // 4)):
+                key, count, data = run[0]
+                heappush(self.A, (key, count, self.decode(data)))
+                self.on_disk -= 1
+                self.advance(run)
+                if run not in self.runs:
+                    break
+
+    def pop(self):
+        if self.runs:
+            self.merge()
+        if not self.A:
+            raise IndexError('pop from empty priority queue')
+        return heappop(self.A)[2]
+
+    def close(self):
+        for run in self.runs:
+            run[1].close()
+        self.runs = []
+        if self.temporary:
+            shutil.rmtree(self.directory, ignore_errors=True)
@@ -1,9 +1,27 @@
 from __future__ import print_function
 from __future__ import generators
 
-from copy import deepcopy
+import hashlib
 import math
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from patternDatabase import PatternDatabase, DEFAULT_DIRECTORY
+from solvability import Solvability
+
+# Actions are small ints; ACTION_NAMES gives their names, in this order
+EMPTY, PUMP, TAKE, TRANSFER = range(4)
+ACTION_NAMES = ['empty', 'pump', 'takeFromI', 'transferFromI']
+ACTION_IDS = dict((name, action) for action, name in enumerate(ACTION_NAMES))
+
+
+def action_name(action):
+    """Name of an action id (None, for the root node, stays None)."""
+    return None if action is None else ACTION_NAMES[action]
+
 
 # ______________________________________________________________________________
 
@@ -21,6 +39,23 @@ class Problem:
         self.initial = initial
         self.goal = goal
 
+    # False when the problem is known to have no solution, so that the
+    # searches can give up before exploring anything
+    solvable = True
+
+    def state_key(self, state):
+        """Key of state in the closed set of graph_search (and, if it is an
+        integer, its serialized form, see state_from_key)."""
+        return state
+
+    def state_from_key(self, key):
+        return key
+
+    def instance_key(self):
+        """String that tells this instance apart from the others (checkpoints
+        of its searches are only resumed on an instance with the same)."""
+        return repr(self.initial)
+
     def successor(self, state):
         """Given a state, return a sequence of (action, state) pairs reachable
         from this state. If there are many successors, consider an iterator
@@ -54,159 +89,360 @@ class Vase:
         self.goal = goal
 
 
-class WaterDistributionState:
+class VaseLayout(object):
+    """Static part of a board: size, pump position and, for every vase, its
+    position, capacity and goal. None of this changes during a search, so it
+    is built once by the problem and shared by all the states.
+    The distances used by the actions and the heuristics are tabulated here
+    too: pump_dist[i] from vase i to the pump, dist[i][y] between vases i and
+    y, and nearest[i], the distance from vase i to its closest water source
+    (the pump or another vase).
+    transitions lists every move as (action id, i, y, distance), in the
+    order the successors are generated: all the empty moves, all the pumps,
+    then takeFromI and transferFromI for every pair x != y."""
 
-    def __init__(self, vases, n, r, c, cost=0):
+    def __init__(self, vases, n, r, c):
         self.n = n
-        self.vases = vases
         self.r = r
         self.c = c
+        self.posX = tuple(v.posX for v in vases)
+        self.posY = tuple(v.posY for v in vases)
+        self.cap = tuple(v.cap for v in vases)
+        self.goal = tuple(v.goal for v in vases)
+
+        n_vases = len(vases)
+        self.pump_dist = tuple(math.hypot(r - self.posX[i], c - self.posY[i])
+                               for i in xrange(n_vases))
+        self.dist = tuple(tuple(math.hypot(self.posX[y] - self.posX[i], self.posY[y] - self.posY[i])
+                                for y in xrange(n_vases))
+                          for i in xrange(n_vases))
+        self.nearest = tuple(min([self.pump_dist[i]] + [self.dist[i][y] for y in xrange(n_vases) if y != i])
+                             for i in xrange(n_vases))
+        vases_range = xrange(n_vases)
+        pairs = [(i, y) for i in vases_range for y in vases_range if i != y]
+        self.transitions = tuple([(EMPTY, i, 0, 0.0) for i in vases_range] +
+                                 [(PUMP, i, 0, self.pump_dist[i]) for i in vases_range] +
+                                 [(TAKE, i, y, self.dist[i][y]) for i, y in pairs] +
+                                 [(TRANSFER, i, y, self.dist[i][y]) for i, y in pairs])
+        self.transition_index = dict(((t[0], t[1], t[2]), k) for k, t in enumerate(self.transitions))
+        self.after = {}
+        self.skipped = {}
+        # The levels read as a number in mixed radix (cap + 1), see key
+        strides = [1]
+        for i in vases_range:
+            strides.append(strides[-1] * (self.cap[i] + 1))
+        self.key_strides = tuple(strides[:-1])
+        self.key_bits = max(1, (strides[-1] - 1).bit_length())
+        if numpy is not None:
+            self.goal_array = numpy.array(self.goal)
+            self.pump_dist_array = numpy.array(self.pump_dist)
+            self.nearest_array = numpy.array(self.nearest)
+
+    def __len__(self):
+        return len(self.cap)
+
+    def key(self, levels):
+        """Compact key of levels: a distinct integer below 2 ** key_bits."""
+        return sum(v * s for v, s in zip(levels, self.key_strides))
+
+    def levels_of(self, key):
+        """The levels whose key is key."""
+        return [(key // s) % (c + 1) for s, c in zip(self.key_strides, self.cap)]
+
+    def transitions_after(self, k):
+        """The transitions worth trying after transition k: those that share
+        a vase with k or come after it. A move on other vases commutes with
+        k, and the path with the two moves in table order is generated
+        anyway. Cached per k, like the others (in skipped)."""
+        after = self.after.get(k)
+        if after is None:
+            def vases(t):
+                return (t[1],) if t[0] == EMPTY or t[0] == PUMP else (t[1], t[2])
+            last = vases(self.transitions[k])
+            kept = [n >= k or any(v in last for v in vases(t)) for n, t in enumerate(self.transitions)]
+            after = self.after[k] = tuple(t for t, keep in zip(self.transitions, kept) if keep)
+            self.skipped[k] = tuple(t for t, keep in zip(self.transitions, kept) if not keep)
+        return after
+
+    # Heuristics over a batch of states: levels is a numpy array with one row
+    # of water levels per state, and the result has one value per row.
+
+    def NAheuristic_batch(self, levels):
+        return (self.goal_array - levels).dot(self.pump_dist_array)
+
+    def Aheuristic_batch(self, levels):
+        return numpy.maximum(self.goal_array - levels, 0).dot(self.nearest_array)
+
+    def Aheuristic2_batch(self, levels):
+        """Aheuristic2 for every row at once: the loops over the vases stay,
+        the per-state branches become masks over the rows."""
+        levels = levels.astype(float)
+        goal = self.goal
+        rows, n = levels.shape
+        gap = numpy.zeros((rows, n))
+        total = numpy.zeros(rows)
+        for i in xrange(n):
+            goal_difference = goal[i] - levels[:, i]
+            active = goal_difference > 0
+            min = goal_difference * self.pump_dist[i]
+            for y in xrange(n):
+                if y == i:
+                    continue
+                dist = self.dist[i][y]
+                surplus = levels[:, y] - goal[y] - gap[:, y]
+                enough = surplus >= goal[i]
+                partial = ~enough & (surplus >= goal_difference)
+                if y < i:
+                    dist_cost = (levels[:, y] - gap[:, y]) * dist + (levels[:, y] - gap[:, y] - goal_difference) * dist
+                else:
+                    dist_cost = levels[:, i] * dist + (levels[:, i] + goal_difference) * dist
+                candidate = numpy.where(enough, goal_difference * dist,
+                                        numpy.where(partial, dist_cost, numpy.inf))
+                better = active & (candidate < min)
+                min = numpy.where(better, candidate, min)
+                gap[:, y] += numpy.where(better, goal_difference, 0)
+            total += numpy.where(active, min, 0)
+        return total
+
+
+class WaterDistributionState(object):
+    """Immutable state: the water level of every vase as a tuple, plus the
+    number of vases whose level differs from the goal (kept up to date by act,
+    so the goal test is O(1)). States with the same levels are equal and hash
+    the same. cost is the energy of the action that produced the state and
+    does not take part in comparisons. key is the compact key of the levels
+    (see VaseLayout.key), also kept up to date by act, and serves as hash."""
+
+    __slots__ = ('layout', 'levels', 'mismatch', 'cost', 'key')
+
+    def __init__(self, layout, levels, mismatch=None, cost=0, key=None):
+        self.layout = layout
+        self.levels = tuple(levels)
+        if mismatch is None:
+            mismatch = sum(1 for v, g in zip(self.levels, layout.goal) if v != g)
+        self.mismatch = mismatch
         self.cost = cost
+        self.key = layout.key(self.levels) if key is None else key
 
     def __getitem__(self, i):
-        return self.vases[i]
-
-    def __setitem__(self, i, val, cap, posX, posY):
-        self.vases[i].value = val
-        self.vases[i].cap = cap
-        self.vases[i].posX = posX
-        self.vases[i].posY = posY
+        return self.levels[i]
+
+    def __len__(self):
+        return len(self.levels)
+
+    def __eq__(self, other):
+        return isinstance(other, WaterDistributionState) and self.levels == other.levels
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __lt__(self, other):
+        return self.levels < other.levels
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def _child(self, cost, i, vi, y=None, vy=None):
+        """Build the successor where vase i holds vi (and vase y holds vy),
+        updating the goal-mismatch count on the touched vases only."""
+        goal = self.layout.goal
+        strides = self.layout.key_strides
+        levels = list(self.levels)
+        mismatch = self.mismatch + (vi != goal[i]) - (levels[i] != goal[i])
+        key = self.key + (vi - levels[i]) * strides[i]
+        levels[i] = vi
+        if y is not None:
+            mismatch += (vy != goal[y]) - (levels[y] != goal[y])
+            key += (vy - levels[y]) * strides[y]
+            levels[y] = vy
+        return WaterDistributionState(self.layout, levels, mismatch, cost, key)
 
     def act(self, action, i, y=0):
-        ch = deepcopy(self)
-
-        if action == 'empty' and self.vases[i].value != 0:
-            ch.vases[i].value = 0
+        """Successor by one action (an id or its name) on vase i (and y), or
+        None if the action is not legal here."""
+        action = ACTION_IDS.get(action, action)
+        if action == EMPTY or action == PUMP:
+            dist = self.layout.pump_dist[i]
+        else:
+            dist = self.layout.dist[i][y]
+        return self.apply(action, i, y, dist)
+
+    def apply(self, action, i, y, dist):
+        """act for a transition (action id, i, y, distance) of the layout:
+        the legality test is a few comparisons on the levels, and a child is
+        only built for legal moves. Pumping into a full vase leaves the state
+        unchanged, so it is not a move."""
+        value = self.levels
+        cap = self.layout.cap
+        vi = value[i]
+
+        if action == EMPTY:
+            if vi != 0:
+                return self._child(0, i, 0)
+
+        elif action == PUMP:
+            if vi != cap[i]:
+                return self._child(dist * vi + dist * cap[i], i, cap[i])
+
+        elif action == TAKE:
+            vy = value[y]
+            if vy >= cap[i] - vi and vi != cap[i] and vy != 0:
+                return self._child(dist * vi + dist * cap[i], i, cap[i], y, vy - (cap[i] - vi))
+
+        elif action == TRANSFER:
+            vy = value[y]
+            if vi <= cap[y] - vy and vy != cap[y] and vi != 0:
+                return self._child(dist * vi, i, 0, y, vy + vi)
+
+        return None
+
+    def legal_count(self, transitions):
+        """Number of legal moves among transitions (the tests of successors,
+        without building the children)."""
+        value = self.levels
+        cap = self.layout.cap
+        count = 0
+        for action, i, y, dist in transitions:
+            vi = value[i]
+            if action == EMPTY:
+                count += vi != 0
+            elif action == PUMP:
+                count += vi != cap[i]
+            elif action == TAKE:
+                vy = value[y]
+                count += vy >= cap[i] - vi and vi != cap[i] and vy != 0
+            else:
+                vy = value[y]
+                count += vi <= cap[y] - vy and vy != cap[y] and vi != 0
+        return count
+
+    def successors(self, transitions=None):
+        """(action id, state, i, y) for every legal move among transitions
+        (all those of the layout by default), in their order. The tests of
+        apply are inlined, so that an illegal move costs no call at all."""
+        value = self.levels
+        cap = self.layout.cap
+        child = self._child
+        for action, i, y, dist in transitions or self.layout.transitions:
+            vi = value[i]
+            if action == EMPTY:
+                if vi != 0:
+                    yield action, child(0, i, 0), i, y
+            elif action == PUMP:
+                if vi != cap[i]:
+                    yield action, child(dist * vi + dist * cap[i], i, cap[i]), i, y
+            elif action == TAKE:
+                vy = value[y]
+                if vy >= cap[i] - vi and vi != cap[i] and vy != 0:
+                    yield action, child(dist * vi + dist * cap[i], i, cap[i], y, vy - (cap[i] - vi)), i, y
+            else:
+                vy = value[y]
+                if vi <= cap[y] - vy and vy != cap[y] and vi != 0:
+                    yield action, child(dist * vi, i, 0, y, vy + vi), i, y
 
-        elif action == 'pump':
 
-            dist = math.hypot(self.r - self.vases[i].posX, self.c - self.vases[i].posY)
-            ch.cost = 1 * dist * self.vases[i].value
-            ch.vases[i].value = self.vases[i].cap
-            ch.cost = ch.cost + (1 * dist * ch.vases[i].value)
+    def NAheuristic2(self):
+        return self.NAheuristic() * 5
 
-        elif action == 'takeFromI' and self.vases[y].value >= self.vases[i].cap - self.vases[i].value and self.vases[i].value != self.vases[i].cap and self.vases[y].value != 0:
 
-            dist = math.hypot(self.vases[y].posX - self.vases[i].posX, self.vases[y].posY - self.vases[i].posY)
-            ch.cost = 1 * dist * self.vases[i].value
-            ch.vases[y].value = self.vases[y].value - (self.vases[i].cap - self.vases[i].value)
-            ch.vases[i].value = self.vases[i].cap
-            ch.cost = ch.cost + (1 * dist * ch.vases[i].value)
+    def NAheuristic2_term(self, i):
+        return self.NAheuristic_term(i) * 5
 
-        elif action == 'transferFromI' and self.vases[i].value <= self.vases[y].cap - self.vases[y].value and self.vases[y].value != self.vases[y].cap and self.vases[i].value != 0:
 
-            dist = math.hypot(self.vases[y].posX - self.vases[i].posX, self.vases[y].posY - self.vases[i].posY)
-            ch.cost = 1 * dist * self.vases[i].value
+    def NAheuristic_term(self, i):
+        return (self.layout.goal[i] - self.levels[i]) * self.layout.pump_dist[i]
 
-            ch.vases[y].value = self.vases[y].value + self.vases[i].value
-            ch.vases[i].value = 0
-        else:
-            return None
 
-        return ch
+    def Aheuristic_term(self, i):
+        if (self.layout.goal[i] - self.levels[i]) > 0:
+            return (self.layout.goal[i] - self.levels[i]) * self.layout.nearest[i]
+        return 0
 
 
-    def NAheuristic2(self):
-        i = 0
-        goal_difference = [0] * (len(self.vases))
-        while i < len(self.vases):
-            goal_difference[i] = self.vases[i].goal - self.vases[i].value
-            dist = math.hypot(self.r - self.vases[i].posX, self.c - self.vases[i].posY)
-            goal_difference[i] = goal_difference[i] * dist
-            i = i + 1
-        return sum(goal_difference) * 5
+    def heuristic_delta(self, term, parent, i, y):
+        """Change of a heuristic that is a sum of per-vase terms (term(state, i))
+        from the parent state to this one. Only vases i and y can differ
+        between the two, so this is O(1) instead of a full evaluation."""
+        delta = term(self, i) - term(parent, i)
+        if y != i:
+            delta += term(self, y) - term(parent, y)
+        return delta
 
 
     def NAheuristic(self):
-        i = 0
-        goal_difference = [0] * (len(self.vases))
-        while i < len(self.vases):
-            goal_difference[i] = self.vases[i].goal - self.vases[i].value
-            dist = math.hypot(self.r - self.vases[i].posX, self.c - self.vases[i].posY)
-            goal_difference[i] = goal_difference[i] * dist
-            i += 1
+        layout = self.layout
+        goal_difference = [0] * len(self.levels)
+        for i in xrange(len(self.levels)):
+            goal_difference[i] = (layout.goal[i] - self.levels[i]) * layout.pump_dist[i]
         return sum(goal_difference)
 
 
     def Aheuristic(self):
-        i = 0
-        goal_difference = [0] * (len(self.vases))
-        while i < len(self.vases):
-            if (self.vases[i].goal - self.vases[i]. value) > 0:
-                goal_difference[i] = self.vases[i].goal - self.vases[i].value
-                min = math.hypot(self.r - self.vases[i].posX, self.c - self.vases[i].posY)
-                y = 0
-                while y < len(self.vases):
-                    if y != i:
-
-                        dist = math.hypot(self.vases[y].posX - self.vases[i].posX, self.vases[y].posY - self.vases[i].posY)
-                        if dist < min:
-                            min = dist
-                    y += 1
-                goal_difference[i] = goal_difference[i] * min
-
-            i += 1
+        layout = self.layout
+        goal_difference = [0] * len(self.levels)
+        for i in xrange(len(self.levels)):
+            if (layout.goal[i] - self.levels[i]) > 0:
+                goal_difference[i] = (layout.goal[i] - self.levels[i]) * layout.nearest[i]
         return sum(goal_difference)
 
 
     def Aheuristic2(self):
-        i = 0
-        gap = [0] * (len(self.vases))
-
-        goal_difference = [0] * (len(self.vases))
-        while i < len(self.vases):
-            if (self.vases[i].goal - self.vases[i]. value) > 0:
-                goal_difference[i] = self.vases[i].goal - self.vases[i].value
-                min = goal_difference[i] * math.hypot(self.r - self.vases[i].posX, self.c - self.vases[i].posY)
-
-                y = 0
-                while y < len(self.vases):
+        layout = self.layout
+        value = self.levels
+        goal = layout.goal
+        n = len(value)
+        gap = [0] * n
+
+        goal_difference = [0] * n
+        for i in xrange(n):
+            if (goal[i] - value[i]) > 0:
+                goal_difference[i] = goal[i] - value[i]
+                min = goal_difference[i] * layout.pump_dist[i]
+
+                for y in xrange(n):
                     x = -1
 
-                    if y != i and (self.vases[y].value - self.vases[y].goal - gap[y]) >= self.vases[i].goal:
-                        dist = math.hypot(self.vases[y].posX - self.vases[i].posX,
-                                          self.vases[y].posY - self.vases[i].posY)
+                    if y != i and (value[y] - goal[y] - gap[y]) >= goal[i]:
+                        dist = layout.dist[i][y]
                         dist = goal_difference[i] * dist
                         if dist < min:
                             min = dist
                             x = y
-                    elif y != i and (self.vases[y].value - self.vases[y].goal - gap[y]) >= (self.vases[i].goal - self.vases[i].value):
-                        dist = math.hypot(self.vases[y].posX - self.vases[i].posX,
-                                          self.vases[y].posY - self.vases[i].posY)
-                        if self.vases[y] < self.vases[i]:
+                    elif y != i and (value[y] - goal[y] - gap[y]) >= (goal[i] - value[i]):
+                        dist = layout.dist[i][y]
+                        if y < i:
 
-                            dist_cost = (self.vases[y].value - gap[y]) * dist + (self.vases[y].value - gap[y] - goal_difference[i]) * dist
+                            dist_cost = (value[y] - gap[y]) * dist + (value[y] - gap[y] - goal_difference[i]) * dist
                             if dist_cost < min:
                                 min = dist_cost
                                 x = y
                         else:
 
-                            dist_cost = self.vases[i].value * dist + (self.vases[i].value + goal_difference[i]) * dist
+                            dist_cost = value[i] * dist + (value[i] + goal_difference[i]) * dist
                             if dist_cost < min:
                                 min = dist_cost
                                 x = y
                     if x >= 0:
                         gap[x] += goal_difference[i]
-                    y += 1
                 goal_difference[i] = min
-            i = i + 1
         return sum(goal_difference)
 
 
 
     def __str__(self):
         """Serialize the state in a human-readable form"""
+        layout = self.layout
         s = ''
         empty = True
-        for r in xrange(self.n):
-            for c in xrange(self.n):
-                if r == self.r and c == self.c:
+        for r in xrange(layout.n):
+            for c in xrange(layout.n):
+                if r == layout.r and c == layout.c:
                     s += '[P,P]'
                     empty = False
-                for i in xrange(len(self.vases)):
-                    if r == self.vases[i].posX and c == self.vases[i].posY:
-                        s += '[%d' % self.vases[i].value
-                        s += ',%d]' % self.vases[i].goal
+                for i in xrange(len(self.levels)):
+                    if r == layout.posX[i] and c == layout.posY[i]:
+                        s += '[%d' % self.levels[i]
+                        s += ',%d]' % layout.goal[i]
                         empty = False
 
                 if empty is True:
@@ -219,77 +455,178 @@ class WaterDistributionState:
 
 
 class WaterPump(Problem):
-    def __init__(self, i, j, r, c, board):
-        self.actions = ['empty', 'pump', 'takeFromI', 'transferFromI']
+    def __init__(self, i, j, r, c, board, check_heuristic=False, partial_order=False):
+        self.actions = ACTION_NAMES
         self.i = i
         self.j = j
+        self.check_heuristic = check_heuristic
+        self.partial_order = partial_order
+        self.pruned = 0
+        self.dead = 0
         self.make_initial_state(i, r, c, board)
+        self.solvability = Solvability(self.layout)
+        self.solvable = self.solvability.feasible(self.initial.levels)
+        if not self.solvable:
+            print('The goal levels cannot be reached from the initial state')
 
     def make_initial_state(self, i, r, c, board):
 
-        self.initial = WaterDistributionState(board, self.i, r, c)
+        self.layout = VaseLayout(board, self.i, r, c)
+        self.initial = WaterDistributionState(self.layout, [v.value for v in board])
 
         print('Problem:', self.__doc__, 'Initial state:\n')
         print(self.initial)
         print('where [.,.] stands for vase with [value,goal] \n=======================================')
 
     def goal_test(self, state):
-        for i in range(len(state.vases)):
-            if state.vases[i].value != state.vases[i].goal:
-                return False
+        return state.mismatch == 0
 
-        return True
+    def state_key(self, state):
+        return state.key
 
-    def path_cost(self, c, state1, action, state2):
-        if action == 'empty':
-            return c
+    def state_from_key(self, key):
+        return WaterDistributionState(self.layout, self.layout.levels_of(key), key=key)
+
+    def instance_key(self):
+        # The state keys only encode levels, whose meaning depends on all this
+        layout = self.layout
+        description = repr((layout.r, layout.c, layout.posX, layout.posY, layout.cap,
+                            layout.goal, tuple(self.initial.levels)))
+        return hashlib.sha1(description.encode('utf-8')).hexdigest()
 
-        elif action == 'pump' or action == 'takeFromI' or action == 'transferFromI':
-            return c + state2.cost
+    def path_cost(self, c, state1, action, state2):
+        # state2.cost is the energy of the action (0 for empty)
+        return c + state2.cost
 
     def h(self, node):
         """No heuristic. A* becomes uniform cost in this case"""
         return 0
 
-    def successor(self, state):
-        """Legal moves (empty, pump, takeFromI, transferFromI). Implemented as a generator"""
-        list = range(len(state.vases))
-        for action in self.actions:
-            if action == 'empty' or action == 'pump':
-                y = 0
-                for i in list:
-                    nexts = state.act(action, i)
-                    if nexts is not None:
-                        yield (action, nexts, i, y)
+    # Cheap lower bound on h, used by deferred_astar_search to queue nodes
+    # whose h is not evaluated yet; None queues them with the parent's f
+    bound_h = None
+
+    # Whether h never overestimates the cost to a goal (h = 0 does not), so
+    # that arastar_search can guarantee a bound on its solutions
+    admissible = True
+
+    def dive_h(self, node):
+        """Guide of searchMethods.greedy_dive: the vases off their goal level.
+        Greedy on the heuristics themselves finds plans less often."""
+        return node.state.mismatch
+
+    def batch_h(self, states):
+        """h of every state in states, computed at once on a states x vases
+        numpy array of levels. Subclasses replace h_levels."""
+        return self.h_levels(numpy.array([s.levels for s in states]))
+
+    def h_levels(self, levels):
+        return numpy.zeros(len(levels))
+
+    def incremental_h(self, node, full, term):
+        """Evaluate a heuristic that is a sum of per-vase terms as the parent's h
+        plus the change on the two vases touched by the action (node.i, node.j).
+        full is the reference evaluator, used for the root and, when
+        check_heuristic is set, to cross-check every incremental value."""
+        parent = node.parent
+        if parent is None or not hasattr(parent, 'h'):
+            return full(node.state)
+        h = parent.h + node.state.heuristic_delta(term, parent.state, node.i, node.j)
+        if self.check_heuristic:
+            reference = full(node.state)
+            if abs(h - reference) > 1e-9 * max(1.0, abs(reference)):
+                raise AssertionError('incremental h %r differs from full h %r' % (h, reference))
+        return h
+
+    def successor(self, state, action=None, i=0, j=0):
+        """Legal moves (empty, pump, takeFromI, transferFromI), as action ids,
+        from the precompiled transitions of the layout. Implemented as a generator.
+        With partial_order set, (action, i, j) is the move that produced state
+        and the moves that commute with it and precede it in the table are
+        skipped (partial-order reduction); pruned counts the skipped moves
+        that are legal, the successors the reduction saves."""
+        transitions = None
+        if self.partial_order and action is not None and action >= 0:
+            layout = self.layout
+            k = layout.transition_index[action, i, j]
+            transitions = layout.transitions_after(k)
+            self.pruned += state.legal_count(layout.skipped[k])
+        if self.solvability.needed:
+            return self.live_successors(state.successors(transitions))
+        return state.successors(transitions)
+
+    def live_successors(self, successors):
+        """successors without the dead states (see solvability.py), counted
+        in dead."""
+        feasible = self.solvability.feasible
+        for move in successors:
+            if feasible(move[1].levels):
+                yield move
             else:
-                for x in list:
-                    for y in list:
-                        if x != y:
-                            nexts = state.act(action, x, y)
-                            if nexts is not None:
-                                yield (action, nexts, x, y)
+                self.dead += 1
 
 
 class WaterPumpDistance(WaterPump):
     """Distance heuristic"""
+    admissible = False
+
     def h(self, node):
-        return node.state.NAheuristic()
+        return self.incremental_h(node, WaterDistributionState.NAheuristic,
+                                  WaterDistributionState.NAheuristic_term)
+
+    def h_levels(self, levels):
+        return self.layout.NAheuristic_batch(levels)
 
 
 class WaterPumpAdmissible(WaterPump):
     """General admissible heuristic"""
     def h(self, node):
-        return node.state.Aheuristic()
+        return self.incremental_h(node, WaterDistributionState.Aheuristic,
+                                  WaterDistributionState.Aheuristic_term)
+
+    def h_levels(self, levels):
+        return self.layout.Aheuristic_batch(levels)
 
 class WaterPumpEfficient(WaterPump):
     """Efficient heuristic """
+    admissible = False
+
     def h(self, node):
+        # The gap bookkeeping couples the vases, so there is no per-vase term.
         return node.state.Aheuristic2()
 
+    def bound_h(self, node):
+        return node.state.Aheuristic()
+
+    def h_levels(self, levels):
+        return self.layout.Aheuristic2_batch(levels)
+
 class WaterPumpInadmissible(WaterPump):
     """In-admissible heuristic that find a suboptimal path"""
+    admissible = False
+
     def h(self, node):
-        return node.state.NAheuristic2()
+        return self.incremental_h(node, WaterDistributionState.NAheuristic2,
+                                  WaterDistributionState.NAheuristic2_term)
+
+    def h_levels(self, levels):
+        return self.layout.NAheuristic_batch(levels) * 5
+
+class WaterPumpPatternDatabase(WaterPump):
+    """Additive pattern database heuristic"""
+    def __init__(self, i, j, r, c, board, check_heuristic=False, partial_order=False,
+                 pattern_size=3, directory=DEFAULT_DIRECTORY):
+        WaterPump.__init__(self, i, j, r, c, board, check_heuristic, partial_order)
+        self.database = PatternDatabase(self.layout, pattern_size, directory)
+
+    def h(self, node):
+        return self.database.h(node.state.levels)
+
+    def bound_h(self, node):
+        return node.state.Aheuristic()
+
+    def h_levels(self, levels):
+        return self.database.h_batch(levels)
 
 
 
@@ -333,4 +670,9 @@ def standardProblem3():
     vases.append(Vase(6, 1, 5, 6))
     vases.append(Vase(7, 7, 4, 4))
     vases.append(Vase(5, 6, 0, 1))
-    return vases
\ No newline at end of file
+    return vases
+
+# Names of the boards above and of the problem classes, one per heuristic
+PROBLEMS = ['basicProblem', 'standardProblem', 'standardProblem2', 'standardProblem3']
+HEURISTICS = ['WaterPump', 'WaterPumpDistance', 'WaterPumpInadmissible',
+              'WaterPumpAdmissible', 'WaterPumpEfficient', 'WaterPumpPatternDatabase']